@@ -5,24 +5,571 @@ Args: event - dict with httpMethod, body, queryStringParameters
 Returns: HTTP response dict with user data, chats, messages
 """
 
+import time
+
+_MODULE_STARTED = time.perf_counter()
+
+import base64
+import hashlib
+import hmac
+import importlib
 import json
 import os
-from typing import Dict, Any, List, Optional
-from datetime import datetime
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import select
+import sys
+import threading
+import traceback
+from collections import OrderedDict
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from datetime import date, datetime
+from decimal import Decimal
+
+STARTUP_BUDGET_MS = float(os.environ.get('STARTUP_BUDGET_MS', '150'))
+
+# Milliseconds spent importing each third-party module, including the ones loaded lazily.
+IMPORT_TIMES: Dict[str, float] = {}
+
+def timed_import(name: str) -> Any:
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    IMPORT_TIMES[name] = round((time.perf_counter() - started) * 1000, 3)
+    return module
+
+try:
+    orjson = timed_import('orjson')
+except ImportError:
+    orjson = None
+
+# psycopg2 is imported on the first database connection (load_db_driver), so preflights
+# and responses served from in-memory caches never pay for it on a cold start.
+psycopg2: Any = None
+TimedCursor: Any = None
+_driver_lock = threading.Lock()
+
+def load_db_driver() -> None:
+    global psycopg2, TimedCursor
+    if psycopg2 is not None:
+        return
+    with _driver_lock:
+        if psycopg2 is not None:
+            return
+        driver = timed_import('psycopg2')
+        timed_import('psycopg2.extensions')
+        extras = timed_import('psycopg2.extras')
+        TimedCursor = make_timed_cursor(extras.RealDictCursor)
+        psycopg2 = driver
+
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '2'))
+DB_POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+DB_POOL_PING_AFTER = float(os.environ.get('DB_POOL_PING_AFTER', '30'))
+
+# Idle connections survive between warm invocations of handler.
+# Each entry is (connection, monotonic time it was returned to the pool).
+_pool: List[Tuple[Any, float]] = []
+_pool_lock = threading.Lock()
+_checked_out = threading.local()
+
+# Set by run_batch: every get_db_connection() of the sub-requests returns this connection
+# and release_db_connection() leaves it to the batch.
+_pinned = threading.local()
+
+POOL_STATS: Dict[str, int] = {'hits': 0, 'misses': 0, 'reconnects': 0, 'discarded': 0}
+
+# Optional streaming replicas for actions routed with read_only=True, as comma-separated URLs.
+# A replica is skipped while its replay lag, re-measured at most every REPLICA_LAG_CHECK_INTERVAL
+# seconds on checkout, exceeds REPLICA_MAX_LAG; with none usable reads go to the primary.
+DATABASE_READ_URLS = [dsn.strip() for dsn in os.environ.get('DATABASE_READ_URLS', '').split(',') if dsn.strip()]
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', '5'))
+REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', '5'))
+# Successful writes return X-Primary-Until; requests that send it back read from the primary
+# until then. The default covers the largest lag a replica can have when it is picked.
+READ_YOUR_WRITES_WINDOW = float(os.environ.get(
+    'READ_YOUR_WRITES_WINDOW', str(REPLICA_MAX_LAG + REPLICA_LAG_CHECK_INTERVAL)
+))
+
+_replica_pools: Dict[str, List[Tuple[Any, float]]] = {dsn: [] for dsn in DATABASE_READ_URLS}
+# dsn -> (lag in seconds, monotonic time it was measured); unmeasured replicas are due for a check.
+_replica_lag: Dict[str, Tuple[float, float]] = {}
+# id(connection) -> replica dsn, so release_db_connection() returns it to the right pool.
+_replica_of: Dict[int, str] = {}
+_replica_turn = 0
+
+# Set by dispatch: replica is True while a read_only route without a read-your-writes pin is
+# running. Set by admit: shed is True while the request may only be answered without the database.
+_db_route = threading.local()
+
+REPLICA_STATS: Dict[str, int] = {'reads': 0, 'fallbacks': 0, 'lagging': 0, 'unreachable': 0}
+
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - pg_last_xact_replay_timestamp()), 'Infinity')
+    END AS lag
+"""
+
+def _connect(dsn: Optional[str] = None):
+    load_db_driver()
+    return psycopg2.connect(dsn or os.environ['DATABASE_URL'])
+
+def _discard(conn) -> None:
+    _replica_of.pop(id(conn), None)
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+def _is_healthy(conn, idle_for: float) -> bool:
+    if conn.closed:
+        return False
+    if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        return False
+    if idle_for < DB_POOL_PING_AFTER:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except Exception:
+        return False
+
+def _track(conn, dsn: Optional[str] = None) -> None:
+    held = getattr(_checked_out, 'conns', None)
+    if held is None:
+        held = _checked_out.conns = []
+    held.append(conn)
+    if dsn is not None:
+        _replica_of[id(conn)] = dsn
+
+class LoadShed(Exception):
+    """Raised by get_db_connection() for a request that admit() decided to shed."""
 
 def get_db_connection():
-    return psycopg2.connect(os.environ['DATABASE_URL'])
+    if getattr(_db_route, 'shed', False):
+        raise LoadShed()
+    pinned = getattr(_pinned, 'conn', None)
+    if pinned is not None:
+        return pinned
+    started = time.perf_counter()
+    try:
+        if getattr(_db_route, 'replica', False):
+            conn = _checkout_replica()
+            if conn is not None:
+                return conn
+            REPLICA_STATS['fallbacks'] += 1
+        return _checkout_connection()
+    finally:
+        record_connect((time.perf_counter() - started) * 1000)
+
+def _next_replica() -> Optional[str]:
+    """Round-robin over replicas within REPLICA_MAX_LAG or due for a lag check."""
+    global _replica_turn
+    now = time.monotonic()
+    with _pool_lock:
+        candidates = [
+            dsn for dsn in DATABASE_READ_URLS
+            if dsn not in _replica_lag
+            or _replica_lag[dsn][0] <= REPLICA_MAX_LAG
+            or now - _replica_lag[dsn][1] >= REPLICA_LAG_CHECK_INTERVAL
+        ]
+        if not candidates:
+            return None
+        _replica_turn += 1
+        return candidates[_replica_turn % len(candidates)]
+
+def _checkout_replica():
+    dsn = _next_replica()
+    if dsn is None:
+        return None
+    conn = None
+    checked = _replica_lag.get(dsn)
+    try:
+        conn = _checkout_connection(dsn)
+        if checked is None or time.monotonic() - checked[1] >= REPLICA_LAG_CHECK_INTERVAL:
+            with conn.cursor() as cur:
+                cur.execute(REPLICA_LAG_SQL)
+                lag = float(cur.fetchone()[0])
+            conn.rollback()
+            checked = _replica_lag[dsn] = (lag, time.monotonic())
+    except psycopg2.Error as e:
+        REPLICA_STATS['unreachable'] += 1
+        _replica_lag[dsn] = (float('inf'), time.monotonic())
+        log_event('replica_unreachable', replica=DATABASE_READ_URLS.index(dsn), error=repr(e))
+        if conn is not None:
+            release_db_connection(conn, broken=True)
+        return None
+    
+    if checked[0] > REPLICA_MAX_LAG:
+        REPLICA_STATS['lagging'] += 1
+        log_event('replica_lagging', replica=DATABASE_READ_URLS.index(dsn), lag_s=checked[0])
+        release_db_connection(conn)
+        return None
+    
+    REPLICA_STATS['reads'] += 1
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics['replica'] = DATABASE_READ_URLS.index(dsn)
+    return conn
+
+def _checkout_connection(dsn: Optional[str] = None):
+    pool = _pool if dsn is None else _replica_pools[dsn]
+    while True:
+        with _pool_lock:
+            if not pool:
+                break
+            conn, released_at = pool.pop()
+        idle_for = time.monotonic() - released_at
+        if idle_for > DB_POOL_IDLE_TIMEOUT:
+            POOL_STATS['discarded'] += 1
+            _discard(conn)
+            continue
+        if _is_healthy(conn, idle_for):
+            POOL_STATS['hits'] += 1
+        else:
+            POOL_STATS['reconnects'] += 1
+            _discard(conn)
+            conn = _connect(dsn)
+        _track(conn, dsn)
+        return conn
+    POOL_STATS['misses'] += 1
+    conn = _connect(dsn)
+    _track(conn, dsn)
+    return conn
+
+def release_db_connection(conn, broken: bool = False) -> None:
+    if conn is getattr(_pinned, 'conn', None):
+        return
+    held = getattr(_checked_out, 'conns', None)
+    if held and conn in held:
+        held.remove(conn)
+    if conn.closed:
+        _replica_of.pop(id(conn), None)
+        return
+    if broken or conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        try:
+            conn.rollback()
+        except Exception:
+            POOL_STATS['discarded'] += 1
+            _discard(conn)
+            return
+    dsn = _replica_of.get(id(conn))
+    pool = _pool if dsn is None else _replica_pools[dsn]
+    with _pool_lock:
+        if len(pool) < DB_POOL_SIZE:
+            pool.append((conn, time.monotonic()))
+            return
+    _discard(conn)
+
+def release_leaked_connections() -> None:
+    """Roll back and return connections an action left checked out after an error."""
+    held = getattr(_checked_out, 'conns', None)
+    while held:
+        release_db_connection(held[-1], broken=True)
+
+def pool_stats() -> Dict[str, Any]:
+    now = time.monotonic()
+    with _pool_lock:
+        idle = len(_pool)
+        replicas = [
+            {
+                'idle': len(_replica_pools[dsn]),
+                'lag_s': _replica_lag[dsn][0] if dsn in _replica_lag and _replica_lag[dsn][0] != float('inf') else None,
+                'checked_s_ago': round(now - _replica_lag[dsn][1], 1) if dsn in _replica_lag else None,
+            }
+            for dsn in DATABASE_READ_URLS
+        ]
+    stats: Dict[str, Any] = dict(POOL_STATS, idle=idle, size=DB_POOL_SIZE)
+    if DATABASE_READ_URLS:
+        stats['replicas'] = replicas
+        stats['replica_reads'] = dict(REPLICA_STATS)
+    return stats
+
+def primary_pinned(event: Dict[str, Any]) -> bool:
+    """True while the X-Primary-Until a client got from its last write is in the future."""
+    until = get_header(event, 'X-Primary-Until')
+    try:
+        return until is not None and float(until) > time.time() * 1000
+    except ValueError:
+        return False
+
+def primary_until() -> str:
+    return str(int((time.time() + READ_YOUR_WRITES_WINDOW) * 1000))
+
+CATALOG_VERSION_CHECK_INTERVAL = float(os.environ.get('CATALOG_VERSION_CHECK_INTERVAL', '30'))
+CATALOG_MAX_AGE = int(os.environ.get('CATALOG_MAX_AGE', '300'))
+CATALOG_CACHE_MAX_ENTRIES = int(os.environ.get('CATALOG_CACHE_MAX_ENTRIES', '256'))
+
+# Catalog tables (gifts, lessons, achievements) carry a version in catalog_versions that
+# statement-level triggers bump on every change. Cached entries are served without touching
+# the database until the versions are re-read, at most every CATALOG_VERSION_CHECK_INTERVAL seconds.
+# Least recently used entries are evicted beyond CATALOG_CACHE_MAX_ENTRIES.
+_catalog_cache: 'OrderedDict[Tuple[Any, ...], Tuple[int, Dict[str, Any]]]' = OrderedDict()
+_catalog_versions: Dict[str, int] = {}
+_catalog_versions_checked_at = 0.0
+_catalog_lock = threading.Lock()
+
+def _refresh_catalog_versions(cur) -> None:
+    global _catalog_versions, _catalog_versions_checked_at
+    cur.execute("SELECT name, version FROM catalog_versions")
+    versions = {row['name']: row['version'] for row in cur.fetchall()}
+    with _catalog_lock:
+        _catalog_versions = versions
+        _catalog_versions_checked_at = time.monotonic()
+
+def cached_catalog(name: str, key: Tuple[Any, ...], loader: Callable[[Any], Any], cur=None) -> Dict[str, Any]:
+    """
+    Returns {'data', 'body', 'etag'} for a catalog query, loading it with loader(cur) only when
+    the catalog version changed. Opens a connection only if cur is None and a check is due.
+    """
+    cache_key = (name,) + key
+    with _catalog_lock:
+        entry = _catalog_cache.get(cache_key)
+        if entry:
+            _catalog_cache.move_to_end(cache_key)
+        versions_fresh = time.monotonic() - _catalog_versions_checked_at < CATALOG_VERSION_CHECK_INTERVAL
+        if entry and versions_fresh and entry[0] == _catalog_versions.get(name, 0):
+            return entry[1]
+    
+    conn = None
+    if cur is None:
+        conn = get_db_connection()
+        cur = conn.cursor(cursor_factory=TimedCursor)
+    try:
+        if not versions_fresh:
+            _refresh_catalog_versions(cur)
+        version = _catalog_versions.get(name, 0)
+        if entry and entry[0] == version:
+            return entry[1]
+        data = loader(cur)
+    finally:
+        if conn is not None:
+            cur.close()
+            release_db_connection(conn)
+    
+    body = to_json(data)
+    value = {'data': data, 'body': body, 'etag': make_etag(body)}
+    with _catalog_lock:
+        _catalog_cache[cache_key] = (version, value)
+        _catalog_cache.move_to_end(cache_key)
+        if len(_catalog_cache) > CATALOG_CACHE_MAX_ENTRIES:
+            _catalog_cache.popitem(last=False)
+    return value
+
+def make_etag(body: str) -> str:
+    return '"' + hashlib.sha1(body.encode('utf-8')).hexdigest()[:20] + '"'
+
+def get_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    headers = event.get('headers') or {}
+    lowered = name.lower()
+    for key, value in headers.items():
+        if key.lower() == lowered:
+            return value
+    return None
+
+def conditional_response(event: Dict[str, Any], body: str, etag: str, cache_control: str) -> Dict[str, Any]:
+    """200 with ETag/Cache-Control, or an empty 304 when If-None-Match already has this ETag."""
+    headers = cors_headers()
+    headers['ETag'] = etag
+    headers['Cache-Control'] = cache_control
+    
+    if_none_match = get_header(event, 'If-None-Match')
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+        return {
+            'statusCode': 304,
+            'headers': headers,
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': body,
+        'isBase64Encoded': False
+    }
+
+def public_cache_control() -> str:
+    return f'public, max-age={CATALOG_MAX_AGE}, stale-while-revalidate={CATALOG_MAX_AGE}'
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING', '') in ('1', 'true', 'yes')
+METRICS_LOG_ENABLED = os.environ.get('METRICS_LOG', 'true') in ('1', 'true', 'yes')
+METRICS_MAX_QUERIES_LOGGED = 50
+
+_request_metrics = threading.local()
+ACTION_STATS: Dict[str, Dict[str, float]] = {}
+_action_stats_lock = threading.Lock()
+
+def sql_shape(query: Any, limit: int = 200) -> str:
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    return ' '.join(str(query).split())[:limit]
+
+def log_event(event_type: str, **fields: Any) -> None:
+    if METRICS_LOG_ENABLED:
+        print(json.dumps(dict(fields, type=event_type), default=str), file=sys.stdout, flush=True)
+
+def start_request_metrics(action: str, method: str) -> Dict[str, Any]:
+    metrics = {
+        'action': action,
+        'method': method,
+        'started': time.perf_counter(),
+        'connect_ms': 0.0,
+        'db_ms': 0.0,
+        'rows': 0,
+        'queries': [],
+    }
+    _request_metrics.current = metrics
+    return metrics
+
+def current_metrics() -> Optional[Dict[str, Any]]:
+    return getattr(_request_metrics, 'current', None)
+
+def record_connect(elapsed_ms: float) -> None:
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics['connect_ms'] += elapsed_ms
+
+def record_query(query: Any, elapsed_ms: float, rows: int) -> None:
+    metrics = current_metrics()
+    rows = max(rows, 0)
+    if metrics is not None:
+        metrics['db_ms'] += elapsed_ms
+        metrics['rows'] += rows
+        metrics['queries'].append((query, elapsed_ms, rows))
+    if elapsed_ms >= SLOW_QUERY_MS:
+        log_event(
+            'slow_query',
+            action=metrics['action'] if metrics else None,
+            ms=round(elapsed_ms, 2),
+            rows=rows,
+            sql=sql_shape(query, 1000)
+        )
+
+def make_timed_cursor(base: type) -> type:
+    class TimedCursor(base):
+        """RealDictCursor that reports each statement's duration and row count to the request metrics."""
+
+        def execute(self, query, vars=None):
+            started = time.perf_counter()
+            try:
+                return super().execute(query, vars)
+            finally:
+                record_query(query, (time.perf_counter() - started) * 1000, self.rowcount)
+
+    return TimedCursor
+
+def finish_request_metrics(metrics: Dict[str, Any], response: Dict[str, Any], error: Optional[BaseException]) -> None:
+    _request_metrics.current = None
+    total_ms = (time.perf_counter() - metrics['started']) * 1000
+    payload_bytes = len((response.get('body') or '').encode('utf-8'))
+    app_ms = max(total_ms - metrics['db_ms'] - metrics['connect_ms'], 0.0)
+    
+    with _action_stats_lock:
+        stats = ACTION_STATS.setdefault(metrics['action'] or '-', {
+            'count': 0, 'errors': 0, 'total_ms': 0.0, 'db_ms': 0.0, 'connect_ms': 0.0, 'max_ms': 0.0, 'queries': 0
+        })
+        stats['count'] += 1
+        stats['errors'] += 1 if response['statusCode'] >= 500 else 0
+        stats['total_ms'] += total_ms
+        stats['db_ms'] += metrics['db_ms']
+        stats['connect_ms'] += metrics['connect_ms']
+        stats['max_ms'] = max(stats['max_ms'], total_ms)
+        stats['queries'] += len(metrics['queries'])
+    if metrics.get('track_load'):
+        record_db_load(metrics['db_ms'] + metrics['connect_ms'])
+    
+    if SERVER_TIMING_ENABLED:
+        response['headers']['Server-Timing'] = ', '.join([
+            f"connect;dur={metrics['connect_ms']:.1f}",
+            f"db;dur={metrics['db_ms']:.1f};desc=\"{len(metrics['queries'])} queries\"",
+            f"app;dur={app_ms:.1f}",
+            f"total;dur={total_ms:.1f}",
+        ])
+        response['headers']['Timing-Allow-Origin'] = '*'
+    
+    fields: Dict[str, Any] = {
+        'action': metrics['action'],
+        'method': metrics['method'],
+        'status': response['statusCode'],
+        'total_ms': round(total_ms, 2),
+        'connect_ms': round(metrics['connect_ms'], 2),
+        'db_ms': round(metrics['db_ms'], 2),
+        'query_count': len(metrics['queries']),
+        'rows': metrics['rows'],
+        'replica': metrics.get('replica'),
+        'payload_bytes': payload_bytes,
+        'queries': [
+            {'sql': sql_shape(query, 120), 'ms': round(ms, 2), 'rows': rows}
+            for query, ms, rows in metrics['queries'][:METRICS_MAX_QUERIES_LOGGED]
+        ],
+    }
+    if error is not None:
+        fields['error'] = type(error).__name__
+        fields['traceback'] = ''.join(traceback.format_exception(type(error), error, error.__traceback__))
+    log_event('request', **fields)
+
+def action_stats() -> Dict[str, Dict[str, float]]:
+    with _action_stats_lock:
+        return {
+            action: dict(stats, avg_ms=round(stats['total_ms'] / stats['count'], 2) if stats['count'] else 0.0)
+            for action, stats in ACTION_STATS.items()
+        }
+
+def encode_cursor(*values: Any) -> str:
+    """Opaque keyset cursor, e.g. encode_cursor(created_at, id)."""
+    raw = '|'.join(v.isoformat() if isinstance(v, datetime) else str(v) for v in values)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str, parts: int) -> List[str]:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        values = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8').split('|')
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if len(values) != parts:
+        raise ValueError('Invalid cursor')
+    return values
+
+def json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def to_json(data: Any) -> str:
+    """
+    Encodes response bodies, including cursor rows as they come from fetchall() without
+    per-row dict() copies. datetime/date become ISO 8601 strings, Decimal becomes a number.
+    Uses orjson when it is installed; the stdlib fallback produces the same compact output.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, default=json_default).decode('utf-8')
+    return json.dumps(data, default=json_default, ensure_ascii=False, separators=(',', ':'))
+
+def escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def bad_request(message: str) -> Dict[str, Any]:
+    return {
+        'statusCode': 400,
+        'headers': cors_headers(),
+        'body': to_json({'error': message}),
+        'isBase64Encoded': False
+    }
 
 def cors_headers():
     return {
         'Content-Type': 'application/json',
         'Access-Control-Allow-Origin': '*',
         'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-        'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+        'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, If-None-Match, X-Primary-Until',
+        'Access-Control-Expose-Headers': 'X-Next-Cursor, ETag, Content-Disposition, X-Primary-Until, Retry-After',
     }
 
+_startup_logged = False
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     params = event.get('queryStringParameters', {}) or {}
@@ -36,62 +583,398 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
+    metrics = start_request_metrics(action, method)
+    error = None
     try:
-        if action == 'register':
-            return register_user(event)
-        elif action == 'login':
-            return login_user(event)
-        elif action == 'users':
-            return get_users(event)
-        elif action == 'user':
-            return get_user_profile(event)
-        elif action == 'update_user':
-            return update_user(event)
-        elif action == 'chats':
-            if method == 'POST':
-                return create_chat(event)
-            return get_user_chats(event)
-        elif action == 'messages':
-            if method == 'POST':
-                return send_message(event)
-            return get_chat_messages(event)
-        elif action == 'achievements':
-            return get_user_achievements(event)
-        elif action == 'add_friend':
-            return add_friend(event)
-        elif action == 'lessons':
-            return get_lessons(event)
-        elif action == 'complete_lesson':
-            return complete_lesson(event)
-        elif action == 'send_gift':
-            return send_gift(event)
-        elif action == 'gifts':
-            return get_gifts(event)
-        else:
+        response = admit(event, method, action) or dispatch(event, method, action)
+    except LoadShed:
+        LIMIT_STATS['shed'] += 1
+        response = rejected(503, LOAD_SHED_RETRY_AFTER, 'Service overloaded, try again later')
+    except Exception as e:
+        error = e
+        response = {
+            'statusCode': 500,
+            'headers': cors_headers(),
+            'body': to_json({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+    finally:
+        _db_route.shed = False
+        release_leaked_connections()
+    
+    finish_request_metrics(metrics, response, error)
+    
+    global _startup_logged
+    if not _startup_logged:
+        _startup_logged = True
+        log_event('startup', **startup_report())
+    return response
+
+def dispatch(event: Dict[str, Any], method: str, action: str) -> Dict[str, Any]:
+    route = ROUTES.get((action, method))
+    if route is None:
+        allowed = [m for a, m in ROUTES if a == action]
+        if allowed:
             return {
-                'statusCode': 404,
-                'headers': cors_headers(),
-                'body': json.dumps({'error': 'Action not found'}),
+                'statusCode': 405,
+                'headers': dict(cors_headers(), Allow=', '.join(allowed)),
+                'body': to_json({'error': 'Method not allowed'}),
                 'isBase64Encoded': False
             }
-    except Exception as e:
         return {
-            'statusCode': 500,
+            'statusCode': 404,
             'headers': cors_headers(),
-            'body': json.dumps({'error': str(e)}),
+            'body': to_json({'error': 'Action not found'}),
             'isBase64Encoded': False
         }
+    
+    if route['timer'] and not timer_authorized(event):
+        return {
+            'statusCode': 403,
+            'headers': cors_headers(),
+            'body': to_json({'error': 'Forbidden'}),
+            'isBase64Encoded': False
+        }
+    
+    if not json_object_body(event):
+        return bad_request('Request body must be a JSON object')
+    missing = missing_params(event, route)
+    if missing:
+        return bad_request(f"Missing required parameters: {', '.join(missing)}")
+    
+    # Timer jobs, long-polls and exports are slow by design; only the rest measure DB load.
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics['track_load'] = route['batch']
+    replica = getattr(_db_route, 'replica', False)
+    _db_route.replica = bool(DATABASE_READ_URLS) and route['read_only'] and not primary_pinned(event)
+    try:
+        response = route['handler'](event)
+    finally:
+        _db_route.replica = replica
+    if route['cache'] and response['statusCode'] == 200 and 'Cache-Control' not in response['headers']:
+        response['headers']['Cache-Control'] = route['cache']
+    if DATABASE_READ_URLS and not route['read_only'] and method != 'GET' and response['statusCode'] < 400:
+        response['headers']['X-Primary-Until'] = primary_until()
+    return response
+
+PRIORITY_LOW = 0
+PRIORITY_NORMAL = 1
+PRIORITY_HIGH = 2
+
+def route(handler: Callable[[Dict[str, Any]], Dict[str, Any]], query: Tuple[str, ...] = (),
+          body: Tuple[str, ...] = (), cache: Optional[str] = 'no-store', batch: bool = True,
+          read_only: bool = False, limit: Optional[Tuple[float, float]] = None,
+          priority: int = PRIORITY_NORMAL, timer: bool = False) -> Dict[str, Any]:
+    """
+    One ROUTES entry. query and body name required query string (or path) parameters and
+    JSON body fields; cache is the Cache-Control of 200 responses that don't set their own;
+    batch=False keeps the action out of action=batch; read_only=True lets the action's
+    connections come from DATABASE_READ_URLS replicas. limit is (requests per second, burst)
+    per client, RATE_LIMIT_RPS/RATE_LIMIT_BURST when None; priority decides load shedding order;
+    timer=True answers only requests carrying TIMER_TOKEN (and implies batch=False).
+    """
+    return {
+        'handler': handler, 'query': query, 'body': body, 'cache': cache, 'batch': batch and not timer,
+        'read_only': read_only, 'limit': limit, 'priority': priority, 'timer': timer,
+    }
+
+# Shared secret of the timer triggers and of stats, sent as X-Timer-Token. Timer routes answer
+# 403 while it is unset.
+TIMER_TOKEN = os.environ.get('TIMER_TOKEN', '')
+
+def timer_authorized(event: Dict[str, Any]) -> bool:
+    token = get_header(event, 'X-Timer-Token') or ''
+    return bool(TIMER_TOKEN) and hmac.compare_digest(token.encode('utf-8'), TIMER_TOKEN.encode('utf-8'))
+
+def json_object_body(event: Dict[str, Any]) -> bool:
+    """True when the body is absent or a JSON object, the only shape handlers read."""
+    if not event.get('body'):
+        return True
+    try:
+        return isinstance(json.loads(event['body']), dict)
+    except ValueError:
+        return False
+
+def missing_params(event: Dict[str, Any], route: Dict[str, Any]) -> List[str]:
+    params = event.get('queryStringParameters') or {}
+    path = event.get('pathParameters') or {}
+    missing = [name for name in route['query'] if not (params.get(name) or path.get(name))]
+    if route['body']:
+        body = json.loads(event.get('body') or '{}')
+        missing += [name for name in route['body'] if body.get(name) in (None, '')]
+    return missing
+
+def startup_report() -> Dict[str, Any]:
+    """Cold-start cost: module import time plus every timed import, against STARTUP_BUDGET_MS."""
+    total = MODULE_IMPORT_MS + sum(ms for name, ms in IMPORT_TIMES.items() if name not in MODULE_IMPORTS)
+    return {
+        'module_ms': MODULE_IMPORT_MS,
+        'imports_ms': dict(IMPORT_TIMES),
+        'total_ms': round(total, 3),
+        'budget_ms': STARTUP_BUDGET_MS,
+        'over_budget': total > STARTUP_BUDGET_MS,
+    }
+
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT', 'true') in ('1', 'true', 'yes')
+RATE_LIMIT_RPS = float(os.environ.get('RATE_LIMIT_RPS', '10'))
+RATE_LIMIT_BURST = float(os.environ.get('RATE_LIMIT_BURST', '30'))
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', '10000'))
+# Also count requests in the rate_limits table, so the limit holds across instances: at most
+# burst + rate * RATE_LIMIT_SHARED_WINDOW requests per client and action in each window.
+RATE_LIMIT_SHARED = os.environ.get('RATE_LIMIT_SHARED', '') in ('1', 'true', 'yes')
+RATE_LIMIT_SHARED_WINDOW = int(os.environ.get('RATE_LIMIT_SHARED_WINDOW', '60'))
+# Low-priority actions get 503 while the average DB time per request is over LOAD_SHED_DB_MS,
+# normal ones over LOAD_SHED_ALL_DB_MS, unless they are answered without the database (cache
+# hits). Off unless LOAD_SHED_DB_MS is set.
+LOAD_SHED_DB_MS = float(os.environ.get('LOAD_SHED_DB_MS', '0'))
+LOAD_SHED_ALL_DB_MS = float(os.environ.get('LOAD_SHED_ALL_DB_MS', str(LOAD_SHED_DB_MS * 2)))
+LOAD_SHED_HALF_LIFE = float(os.environ.get('LOAD_SHED_HALF_LIFE', '10'))
+LOAD_SHED_RETRY_AFTER = int(os.environ.get('LOAD_SHED_RETRY_AFTER', '5'))
+
+# (client, action, method) -> (tokens, monotonic time of the last refill), least recently used first.
+_buckets: 'OrderedDict[Tuple[str, str, str], Tuple[float, float]]' = OrderedDict()
+_buckets_lock = threading.Lock()
+# Exponentially weighted DB + connect ms per batchable request, decaying by half every LOAD_SHED_HALF_LIFE
+# seconds so shedding stops once the requests that are still admitted get fast again.
+_db_load = [0.0, time.monotonic()]
+_db_load_lock = threading.Lock()
+
+LIMIT_STATS: Dict[str, int] = {'limited': 0, 'shed': 0, 'shared_errors': 0}
+
+def rate_limit_identity(event: Dict[str, Any]) -> Optional[str]:
+    """X-User-Id when the client sends it, else the source IP; None for timer invocations."""
+    user_id = get_header(event, 'X-User-Id')
+    if user_id:
+        return 'u:' + user_id[:64]
+    source_ip = ((event.get('requestContext') or {}).get('identity') or {}).get('sourceIp')
+    return 'ip:' + source_ip if source_ip else None
+
+def take_token(key: Tuple[str, str, str], rate: float, burst: float) -> float:
+    """Takes a token from the key's bucket; returns 0, or the seconds until one is available."""
+    now = time.monotonic()
+    with _buckets_lock:
+        tokens, refilled = _buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - refilled) * rate)
+        wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+        _buckets[key] = (tokens - 1 if wait == 0 else tokens, now)
+        if len(_buckets) > RATE_LIMIT_MAX_KEYS:
+            _buckets.popitem(last=False)
+    return wait
+
+def take_shared_token(key: Tuple[str, str, str], rate: float, burst: float) -> float:
+    """Counts the request in rate_limits; returns 0, or the seconds until the window resets."""
+    conn = _checkout_connection()
+    cur = conn.cursor(cursor_factory=TimedCursor)
+    try:
+        cur.execute("""
+            WITH now AS (
+                SELECT EXTRACT(EPOCH FROM clock_timestamp()) AS epoch
+            )
+            INSERT INTO rate_limits (key, window_id, hits)
+            SELECT %(key)s, FLOOR(epoch / %(window)s)::bigint, 1 FROM now
+            ON CONFLICT (key) DO UPDATE
+            SET hits = CASE WHEN rate_limits.window_id = EXCLUDED.window_id THEN rate_limits.hits + 1 ELSE 1 END,
+                window_id = EXCLUDED.window_id
+            RETURNING hits, (window_id + 1) * %(window)s - (SELECT epoch FROM now) AS resets_in
+        """, {'key': ':'.join(key), 'window': RATE_LIMIT_SHARED_WINDOW})
+        row = cur.fetchone()
+        conn.commit()
+    finally:
+        cur.close()
+        release_db_connection(conn)
+    allowed = burst + rate * RATE_LIMIT_SHARED_WINDOW
+    return 0.0 if row['hits'] <= allowed else max(float(row['resets_in']), 0.0)
+
+def db_load_ms() -> float:
+    value, updated = _db_load
+    return value * 0.5 ** ((time.monotonic() - updated) / LOAD_SHED_HALF_LIFE)
+
+def record_db_load(elapsed_ms: float) -> None:
+    with _db_load_lock:
+        _db_load[:] = [db_load_ms() * 0.8 + elapsed_ms * 0.2, time.monotonic()]
+
+def limit_stats() -> Dict[str, Any]:
+    with _buckets_lock:
+        clients = len(_buckets)
+    return dict(LIMIT_STATS, db_load_ms=round(db_load_ms(), 2), tracked_keys=clients)
+
+def rejected(status: int, retry_after: float, message: str) -> Dict[str, Any]:
+    seconds = max(1, int(retry_after + 0.999))
+    return {
+        'statusCode': status,
+        'headers': dict(cors_headers(), **{'Retry-After': str(seconds)}),
+        'body': to_json({'error': message, 'retryAfter': seconds}),
+        'isBase64Encoded': False
+    }
+
+def admit(event: Dict[str, Any], method: str, action: str) -> Optional[Dict[str, Any]]:
+    """
+    429 when the client is over the route's rate limit, None to let the request through.
+    Under DB load the request is marked shed instead: it is still answered from caches, and
+    its first get_db_connection() raises LoadShed, which becomes a 503. Requests without a
+    client identity (timers) and unknown actions are not limited.
+    """
+    route = ROUTES.get((action, method))
+    if route is None:
+        return None
+    
+    if LOAD_SHED_DB_MS > 0 and route['priority'] < PRIORITY_HIGH:
+        threshold = LOAD_SHED_DB_MS if route['priority'] == PRIORITY_LOW else LOAD_SHED_ALL_DB_MS
+        _db_route.shed = db_load_ms() > threshold
+    
+    identity = rate_limit_identity(event)
+    if not RATE_LIMIT_ENABLED or identity is None:
+        return None
+    rate, burst = route['limit'] or (RATE_LIMIT_RPS, RATE_LIMIT_BURST)
+    key = (identity, action, method)
+    wait = take_token(key, rate, burst)
+    if wait == 0 and RATE_LIMIT_SHARED:
+        try:
+            wait = take_shared_token(key, rate, burst)
+        except Exception as e:
+            LIMIT_STATS['shared_errors'] += 1
+            log_event('rate_limit_shared_error', action=action, error=repr(e))
+    if wait > 0:
+        LIMIT_STATS['limited'] += 1
+        return rejected(429, wait, 'Too many requests')
+    return None
+
+BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', '20'))
+BATCH_RESPONSE_HEADERS = ('ETag', 'X-Next-Cursor', 'Retry-After')
+
+def batch_event(event: Dict[str, Any], item: Dict[str, Any], action: str, method: str) -> Dict[str, Any]:
+    params = {k: str(v).lower() if isinstance(v, bool) else str(v) for k, v in (item.get('params') or {}).items()}
+    params['action'] = action
+    return {
+        'httpMethod': method,
+        'queryStringParameters': params,
+        'headers': dict(event.get('headers') or {}, **(item.get('headers') or {})),
+        'body': json.dumps(item['body']) if item.get('body') is not None else '{}',
+        'requestContext': event.get('requestContext'),
+    }
+
+def batch_result(response: Dict[str, Any]) -> str:
+    """Embeds the sub-response body as is instead of decoding and re-encoding it."""
+    headers = {k: response['headers'][k] for k in BATCH_RESPONSE_HEADERS if k in response['headers']}
+    return f'{{"status":{response["statusCode"]},"headers":{to_json(headers)},"body":{response["body"] or "null"}}}'
+
+def run_batch(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Runs sub-requests {id, action, method, params, body} through the route table over one
+    pooled connection and returns {"results": {id: {status, headers, body}}}. Each item is
+    charged to its own action's rate limit and shed like a request of its own.
+    When every sub-request is a GET they share one REPEATABLE READ, READ ONLY transaction,
+    so the results come from a single snapshot; each item runs in a savepoint so a failing
+    one doesn't abort the rest. Batches with writes run each item in its own transaction,
+    as the actions commit themselves.
+    """
+    try:
+        items = json.loads(event.get('body') or '{}').get('requests')
+    except ValueError:
+        return bad_request('Invalid JSON body')
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        return bad_request('requests must be a non-empty list of objects')
+    if len(items) > BATCH_MAX_REQUESTS:
+        return bad_request(f'At most {BATCH_MAX_REQUESTS} requests per batch')
+    
+    ids = [str(item.get('id', index)) for index, item in enumerate(items)]
+    if len(set(ids)) != len(ids):
+        return bad_request('Duplicate request ids')
+    
+    planned = []
+    for item in items:
+        action = item.get('action', '')
+        method = item.get('method', 'GET').upper()
+        route = ROUTES.get((action, method))
+        planned.append((item, action, method, route))
+    read_only = all(method == 'GET' for _, _, method, _ in planned)
+    if not all(route is not None and route['read_only'] for _, _, _, route in planned):
+        _db_route.replica = False
+    
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=TimedCursor)
+    if read_only:
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+    
+    results = []
+    _pinned.conn = conn
+    try:
+        for item_id, (item, action, method, route) in zip(ids, planned):
+            if route is not None and not route['batch']:
+                response = bad_request(f'Action {action} cannot be batched')
+            else:
+                sub_event = batch_event(event, item, action, method)
+                if read_only:
+                    cur.execute("SAVEPOINT batch_item")
+                try:
+                    response = admit(sub_event, method, action) or dispatch(sub_event, method, action)
+                    if read_only:
+                        cur.execute("RELEASE SAVEPOINT batch_item")
+                except LoadShed:
+                    if read_only:
+                        cur.execute("RELEASE SAVEPOINT batch_item")
+                    LIMIT_STATS['shed'] += 1
+                    response = rejected(503, LOAD_SHED_RETRY_AFTER, 'Service overloaded, try again later')
+                except Exception as e:
+                    if read_only:
+                        cur.execute("ROLLBACK TO SAVEPOINT batch_item")
+                    else:
+                        conn.rollback()
+                    log_event('batch_item_error', action=action, error=repr(e))
+                    response = {
+                        'statusCode': 500,
+                        'headers': cors_headers(),
+                        'body': to_json({'error': str(e)}),
+                        'isBase64Encoded': False
+                    }
+                finally:
+                    _db_route.shed = False
+            results.append(f'{to_json(item_id)}:{batch_result(response)}')
+    finally:
+        _pinned.conn = None
+        conn.rollback()
+        cur.close()
+        release_db_connection(conn)
+    
+    headers = cors_headers()
+    if DATABASE_READ_URLS and not read_only:
+        headers['X-Primary-Until'] = primary_until()
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': '{"results":{' + ','.join(results) + '}}',
+        'isBase64Encoded': False
+    }
+
+def get_stats(event: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'statusCode': 200,
+        'headers': cors_headers(),
+        'body': to_json({
+            'pool': pool_stats(), 'actions': action_stats(), 'startup': startup_report(), 'limits': limit_stats()
+        }),
+        'isBase64Encoded': False
+    }
 
 def register_user(event: Dict[str, Any]) -> Dict[str, Any]:
     body = json.loads(event.get('body', '{}'))
     
     conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = conn.cursor(cursor_factory=TimedCursor)
     
     cur.execute("""
-        INSERT INTO users (email, name, avatar, native_language, learning_language, country)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        RETURNING id, email, name, avatar, native_language, learning_language, level, xp, country, is_vip, coins
+        WITH new_user AS (
+            INSERT INTO users (email, name, avatar, native_language, learning_language, country)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            RETURNING id, email, name, avatar, native_language, learning_language, level, xp, country, is_vip, coins
+        ), provisioned AS (
+            INSERT INTO user_achievements (user_id, achievement_id, progress)
+            SELECT new_user.id, a.id,
+                   CASE a.requirement_type WHEN 'level' THEN new_user.level ELSE 0 END
+            FROM new_user CROSS JOIN achievements a
+        )
+        SELECT * FROM new_user
     """, (
         body['email'],
         body['name'],
@@ -103,23 +986,14 @@ def register_user(event: Dict[str, Any]) -> Dict[str, Any]:
     
     user = cur.fetchone()
     
-    cur.execute("SELECT id FROM achievements")
-    achievements = cur.fetchall()
-    
-    for ach in achievements:
-        cur.execute(
-            "INSERT INTO user_achievements (user_id, achievement_id, progress) VALUES (%s, %s, 0)",
-            (user['id'], ach['id'])
-        )
-    
     conn.commit()
     cur.close()
-    conn.close()
+    release_db_connection(conn)
     
     return {
         'statusCode': 201,
         'headers': cors_headers(),
-        'body': json.dumps(dict(user)),
+        'body': to_json(user),
         'isBase64Encoded': False
     }
 
@@ -127,144 +1001,492 @@ def login_user(event: Dict[str, Any]) -> Dict[str, Any]:
     body = json.loads(event.get('body', '{}'))
     
     conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = conn.cursor(cursor_factory=TimedCursor)
     
-    cur.execute("""
+    cur.execute(f"""
         SELECT id, email, name, avatar, native_language, learning_language, 
                level, xp, country, is_vip, vip_badge, avatar_frame, coins,
-               streak_days, total_messages, words_learned, gifts_received,
-               region, city, is_online
+               streak_days, {message_total_sql()} AS total_messages, words_learned, gifts_received,
+               region, city
         FROM users WHERE email = %s
     """, (body['email'],))
     
     user = cur.fetchone()
     
     if user:
-        cur.execute(
-            "UPDATE users SET last_seen = CURRENT_TIMESTAMP, is_online = true WHERE id = %s",
-            (user['id'],)
-        )
+        cur.execute("""
+            UPDATE users
+            SET last_seen = CURRENT_TIMESTAMP,
+                streak_days = CASE
+                    WHEN last_active::date = CURRENT_DATE THEN GREATEST(streak_days, 1)
+                    WHEN last_active::date = CURRENT_DATE - 1 THEN streak_days + 1
+                    ELSE 1
+                END,
+                last_active = CURRENT_TIMESTAMP
+            WHERE id = %s
+            RETURNING streak_days
+        """, (user['id'],))
+        user['streak_days'] = cur.fetchone()['streak_days']
+        advance_achievements(cur, [user['id']], 'streak', value=user['streak_days'])
+        write_heartbeats(cur, {user['id']: time.monotonic()})
         conn.commit()
+        user['is_online'] = True
     
     cur.close()
-    conn.close()
+    release_db_connection(conn)
     
     if not user:
         return {
             'statusCode': 404,
             'headers': cors_headers(),
-            'body': json.dumps({'error': 'User not found'}),
+            'body': to_json({'error': 'User not found'}),
             'isBase64Encoded': False
         }
     
     return {
         'statusCode': 200,
         'headers': cors_headers(),
-        'body': json.dumps(dict(user)),
+        'body': to_json(user),
+        'isBase64Encoded': False
+    }
+
+PRESENCE_TTL = float(os.environ.get('PRESENCE_TTL', '90'))
+PRESENCE_FLUSH_INTERVAL = float(os.environ.get('PRESENCE_FLUSH_INTERVAL', '5'))
+PRESENCE_PRUNE_INTERVAL = float(os.environ.get('PRESENCE_PRUNE_INTERVAL', '300'))
+# users.last_seen is refreshed from heartbeats at most this often per user.
+PRESENCE_LAST_SEEN_GRANULARITY = float(os.environ.get('PRESENCE_LAST_SEEN_GRANULARITY', '60'))
+PRESENCE_LOOKUP_MAX = 200
+
+# Heartbeats received by this instance and not yet written: user_id -> monotonic time.
+_presence_buffer: Dict[int, float] = {}
+_presence_lock = threading.Lock()
+_presence_flushed_at = 0.0
+_presence_pruned_at = time.monotonic()
+
+def online_sql(presence_alias: str = 'p') -> str:
+    """True when the presence row's last heartbeat is within PRESENCE_TTL; takes one parameter."""
+    return f"COALESCE({presence_alias}.last_heartbeat > CURRENT_TIMESTAMP - make_interval(secs => %s), false)"
+
+# Sources for onlineOnly listings while beats are buffered: presence rows other than the
+# buffered user_ids (one parameter), and the buffered beats as rows (user_ids, ages).
+PRESENCE_FLUSHED_SQL = "(SELECT * FROM presence WHERE user_id <> ALL(%s))"
+PRESENCE_BUFFERED_SQL = """(
+    SELECT user_id, (CURRENT_TIMESTAMP - make_interval(secs => age))::timestamp AS last_heartbeat
+    FROM unnest(%s::int[], %s::float8[]) AS b(user_id, age)
+)"""
+
+def buffered_beats() -> Tuple[List[int], List[float]]:
+    """
+    This instance's unflushed heartbeats still within PRESENCE_TTL, as (user_ids, ages in
+    seconds); readers merge them so a beat counts before its flush.
+    """
+    now = time.monotonic()
+    with _presence_lock:
+        beats = {u: now - at for u, at in _presence_buffer.items() if now - at < PRESENCE_TTL}
+    user_ids = sorted(beats)
+    return user_ids, [max(beats[u], 0.0) for u in user_ids]
+
+def mark_buffered_online(users: List[Dict[str, Any]]) -> None:
+    """Sets is_online for listed users whose latest beat is still buffered here."""
+    buffered = set(buffered_beats()[0])
+    for user in users:
+        user['is_online'] = user['is_online'] or user['id'] in buffered
+
+def write_heartbeats(cur, beats: Dict[int, float]) -> None:
+    """
+    Upserts heartbeats into the unlogged presence table, converting monotonic receive times
+    to database timestamps, and moves users.last_seen forward only when it is older than
+    PRESENCE_LAST_SEEN_GRANULARITY. Rows are written in user_id order to keep lock order stable.
+    """
+    now = time.monotonic()
+    user_ids = sorted(beats)
+    cur.execute("""
+        WITH beats AS (
+            SELECT user_id, CURRENT_TIMESTAMP - make_interval(secs => age) AS at
+            FROM unnest(%s::int[], %s::float8[]) AS b(user_id, age)
+        ), upserted AS (
+            INSERT INTO presence (user_id, last_heartbeat)
+            SELECT user_id, at FROM beats
+            ON CONFLICT (user_id) DO UPDATE
+            SET last_heartbeat = GREATEST(presence.last_heartbeat, EXCLUDED.last_heartbeat)
+        )
+        UPDATE users u SET last_seen = b.at
+        FROM beats b
+        WHERE u.id = b.user_id
+          AND (u.last_seen IS NULL OR u.last_seen < b.at - make_interval(secs => %s))
+    """, (user_ids, [max(now - beats[u], 0.0) for u in user_ids], PRESENCE_LAST_SEEN_GRANULARITY))
+
+def flush_presence(force: bool = False) -> int:
+    """
+    Writes buffered heartbeats once PRESENCE_FLUSH_INTERVAL has passed since the last flush.
+    Skipped inside a batch, whose pinned connection is a read-only snapshot; get_presence,
+    get_users and get_matches merge buffered_beats(), so the beats just wait for the next flush.
+    """
+    global _presence_flushed_at, _presence_pruned_at
+    if getattr(_db_route, 'shed', False) or getattr(_pinned, 'conn', None) is not None:
+        return 0
+    now = time.monotonic()
+    with _presence_lock:
+        if not _presence_buffer or (not force and now - _presence_flushed_at < PRESENCE_FLUSH_INTERVAL):
+            return 0
+        beats = dict(_presence_buffer)
+        _presence_buffer.clear()
+        _presence_flushed_at = now
+        prune = now - _presence_pruned_at >= PRESENCE_PRUNE_INTERVAL
+        if prune:
+            _presence_pruned_at = now
+    
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=TimedCursor)
+    try:
+        write_heartbeats(cur, beats)
+        if prune:
+            cur.execute(
+                "DELETE FROM presence WHERE last_heartbeat < CURRENT_TIMESTAMP - make_interval(secs => %s)",
+                (PRESENCE_TTL,)
+            )
+        conn.commit()
+    except Exception:
+        # Put the beats back so the next flush retries them, unless newer ones arrived.
+        with _presence_lock:
+            for user_id, at in beats.items():
+                _presence_buffer.setdefault(user_id, at)
+        raise
+    finally:
+        cur.close()
+        release_db_connection(conn)
+    return len(beats)
+
+def heartbeat(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Marks userId online. Beats are buffered per instance and written in batches, so most
+    heartbeats cost no database round trip; clients should beat well within PRESENCE_TTL.
+    """
+    body = json.loads(event.get('body', '{}'))
+    with _presence_lock:
+        _presence_buffer[int(body['userId'])] = time.monotonic()
+    flush_presence()
+    
+    return {
+        'statusCode': 200,
+        'headers': cors_headers(),
+        'body': to_json({'ttl': PRESENCE_TTL}),
+        'isBase64Encoded': False
+    }
+
+def get_presence(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Bulk "who is online" for a comma-separated ids list, including beats still buffered here."""
+    params = event.get('queryStringParameters', {}) or {}
+    try:
+        user_ids = list(dict.fromkeys(int(i) for i in params['ids'].split(',') if i.strip()))
+    except ValueError:
+        return bad_request('ids must be a comma-separated list of integers')
+    if len(user_ids) > PRESENCE_LOOKUP_MAX:
+        return bad_request(f'At most {PRESENCE_LOOKUP_MAX} ids per request')
+    
+    flush_presence()
+    
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=TimedCursor)
+    cur.execute(f"""
+        SELECT u.id, {online_sql()} AS is_online,
+               GREATEST(u.last_seen, p.last_heartbeat) AS last_seen
+        FROM users u
+        LEFT JOIN presence p ON p.user_id = u.id
+        WHERE u.id = ANY(%s)
+    """, (PRESENCE_TTL, user_ids))
+    users = cur.fetchall()
+    cur.close()
+    release_db_connection(conn)
+    
+    mark_buffered_online(users)
+    
+    return {
+        'statusCode': 200,
+        'headers': cors_headers(),
+        'body': to_json(users),
         'isBase64Encoded': False
     }
 
+USERS_PAGE_MAX = 100
+# pg_trgm indexes only help for patterns with at least one full trigram.
+SEARCH_TRGM_MIN_LENGTH = 3
+
+def search_languages(search: str) -> List[str]:
+    """
+    Every name of the languages the term is a prefix of, in all spellings LANGUAGE_CODES
+    knows, e.g. 'spa' -> ['spanish', 'español', 'испанский'].
+    """
+    if len(search) < SEARCH_TRGM_MIN_LENGTH:
+        return []
+    codes = {code for name, code in LANGUAGE_CODES.items() if name.startswith(search)}
+    return [name for name, code in LANGUAGE_CODES.items() if code in codes]
+
 def get_users(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    User search over name, languages and country (the search_text column). Long terms are
+    ranked by word-similarity distance, read in order from the GiST trigram index. Terms
+    naming a language ('eng', 'spa') would match a large share of users with equal rank, so
+    they list unranked, also matching the language's other spellings exactly; so do terms
+    too short for trigrams. Short country values are treated as codes and matched exactly.
+    Without a ranked search, onlineOnly listings walk the presence heartbeat index and the
+    others the users last_seen index, stopping once a page is filled.
+    is_online is derived from presence and this instance's buffered beats. Pages continue via the X-Next-Cursor header.
+    """
     params = event.get('queryStringParameters', {}) or {}
-    search = params.get('search', '')
-    limit = int(params.get('limit', 20))
-    region = params.get('region', '')
-    country = params.get('country', '')
+    search = params.get('search', '').strip().lower()
+    limit = min(int(params.get('limit', 20)), USERS_PAGE_MAX)
+    region = params.get('region', '').strip().lower()
+    country = params.get('country', '').strip().lower()
     online_only = params.get('onlineOnly', '') == 'true'
+    cursor = params.get('cursor')
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    languages = search_languages(search)
+    ranked = len(search) >= SEARCH_TRGM_MIN_LENGTH and not languages
     
-    query = """
-        SELECT id, name, avatar, native_language as language, 
-               learning_language as learning, level, country, region, city,
-               is_vip, vip_badge, avatar_frame, is_online, last_seen
-        FROM users 
-        WHERE 1=1
+    query = f"""
+        SELECT u.id, u.name, u.avatar, u.native_language as language, 
+               u.learning_language as learning, u.level, u.country, u.region, u.city,
+               u.is_vip, u.vip_badge, u.avatar_frame,
+               {online_sql()} AS is_online,
+               GREATEST(u.last_seen, p.last_heartbeat) AS last_seen
     """
-    params_list = []
+    params_list: List[Any] = [PRESENCE_TTL]
     
-    if search:
-        query += " AND (name ILIKE %s OR native_language ILIKE %s OR learning_language ILIKE %s OR country ILIKE %s)"
-        search_param = f'%{search}%'
-        params_list.extend([search_param, search_param, search_param, search_param])
+    if ranked:
+        query += ", %s <<-> u.search_text as rank"
+        params_list.append(search)
+    elif online_only:
+        query += ", p.last_heartbeat as sort_key"
+    else:
+        query += ", u.last_seen as sort_key"
+    
+    buffered_ids, buffered_ages = buffered_beats() if online_only else ([], [])
+    source_at = len(params_list)
+    if online_only:
+        query += """
+            FROM {presence} p
+            JOIN users u ON u.id = p.user_id
+            WHERE p.last_heartbeat > CURRENT_TIMESTAMP - make_interval(secs => %s)
+        """
+        params_list.append(PRESENCE_TTL)
+    else:
+        query += """
+            FROM users u
+            LEFT JOIN presence p ON p.user_id = u.id
+            WHERE 1=1
+        """
+    
+    if ranked:
+        query += " AND u.search_text LIKE %s"
+        params_list.append(f'%{escape_like(search)}%')
+    elif languages:
+        query += """ AND (u.search_text LIKE %s
+                          OR lower(u.native_language) = ANY(%s) OR lower(u.learning_language) = ANY(%s))"""
+        params_list.extend([f'%{escape_like(search)}%', languages, languages])
+    elif search:
+        query += " AND u.search_text LIKE %s"
+        params_list.append(f'%{escape_like(search)}%')
     
     if region:
-        query += " AND region ILIKE %s"
-        params_list.append(f'%{region}%')
+        query += " AND lower(u.region) LIKE %s"
+        params_list.append(f'%{escape_like(region)}%')
     
     if country:
-        query += " AND country ILIKE %s"
-        params_list.append(f'%{country}%')
+        if len(country) <= 3:
+            query += " AND lower(u.country) = %s"
+            params_list.append(country)
+        else:
+            query += " AND lower(u.country) LIKE %s"
+            params_list.append(f'%{escape_like(country)}%')
     
-    if online_only:
-        query += " AND is_online = true"
+    try:
+        if cursor and ranked:
+            rank, user_id = decode_cursor(cursor, 2)
+            query += " AND (%s <<-> u.search_text, u.id) > (%s::real, %s::int)"
+            params_list.extend([search, rank, user_id])
+        elif cursor:
+            sort_key, user_id = decode_cursor(cursor, 2)
+            column = 'p.last_heartbeat' if online_only else 'u.last_seen'
+            query += f" AND ({column}, u.id) < (%s::timestamp, %s::int)"
+            params_list.extend([sort_key, user_id])
+    except ValueError as e:
+        return bad_request(str(e))
+    
+    if ranked:
+        query += " ORDER BY rank, u.id LIMIT %s"
+    elif online_only:
+        query += " ORDER BY p.last_heartbeat DESC, u.id DESC LIMIT %s"
+    else:
+        query += " ORDER BY u.last_seen DESC NULLS LAST, u.id DESC LIMIT %s"
+    params_list.append(limit + 1)
+    
+    if online_only and buffered_ids:
+        # Beats still buffered on this instance stand in for those users' presence rows: the
+        # page is read over both and merged, so the presence branch keeps its ordered index scan.
+        head, tail = params_list[:source_at], params_list[source_at:]
+        query = f"""
+            ({query.format(presence=PRESENCE_FLUSHED_SQL)})
+            UNION ALL
+            ({query.format(presence=PRESENCE_BUFFERED_SQL)})
+            ORDER BY {'rank, id' if ranked else 'sort_key DESC, id DESC'} LIMIT %s
+        """
+        params_list = head + [buffered_ids] + tail + head + [buffered_ids, buffered_ages] + tail + [limit + 1]
+    elif online_only:
+        query = query.format(presence='presence')
     
-    query += " ORDER BY is_online DESC, last_seen DESC LIMIT %s"
-    params_list.append(limit)
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=TimedCursor)
     
     cur.execute(query, tuple(params_list))
     
     users_raw = cur.fetchall()
     
-    users = []
-    for user in users_raw:
-        user_dict = dict(user)
-        if 'last_seen' in user_dict and user_dict['last_seen']:
-            user_dict['last_seen'] = user_dict['last_seen'].isoformat()
-        users.append(user_dict)
+    cur.close()
+    release_db_connection(conn)
+    
+    headers = cors_headers()
+    if len(users_raw) > limit:
+        users_raw = users_raw[:limit]
+        last = users_raw[-1]
+        if ranked:
+            headers['X-Next-Cursor'] = encode_cursor(last['rank'], last['id'])
+        elif last['sort_key'] is not None:
+            headers['X-Next-Cursor'] = encode_cursor(last['sort_key'], last['id'])
+    
+    mark_buffered_online(users_raw)
+    for user in users_raw:
+        user.pop('rank', None)
+        user.pop('sort_key', None)
+    
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': to_json(users_raw),
+        'isBase64Encoded': False
+    }
+
+MATCHES_PAGE_MAX = 100
+
+def get_matches(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reciprocal language-exchange partners of userId: users whose native language is their
+    learning language and vice versa, compared as canonical codes (native_code and
+    learning_code, so 'English' meets 'Английский'), most recently active first (heartbeats keep
+    last_seen fresh, so online partners lead). The languages are resolved in InitPlans,
+    so the page is an ordered scan of idx_users_matches, or of idx_users_matches_country
+    when country is given; region narrows that scan. Pages continue via X-Next-Cursor.
+    """
+    params = event.get('queryStringParameters', {}) or {}
+    user_id = params.get('userId')
+    limit = min(int(params.get('limit', 20)), MATCHES_PAGE_MAX)
+    country = params.get('country', '').strip().lower()
+    region = params.get('region', '').strip().lower()
+    cursor = params.get('cursor')
+    
+    query = f"""
+        SELECT u.id, u.name, u.avatar, u.native_language as language,
+               u.learning_language as learning, u.level, u.country, u.region, u.city,
+               u.is_vip, u.vip_badge, u.avatar_frame,
+               {online_sql()} AS is_online,
+               GREATEST(u.last_seen, p.last_heartbeat) AS last_seen,
+               u.last_seen AS sort_key
+        FROM users u
+        LEFT JOIN presence p ON p.user_id = u.id
+        WHERE u.native_code = (SELECT learning_code FROM users WHERE id = %s)
+          AND u.learning_code = (SELECT native_code FROM users WHERE id = %s)
+          AND u.id <> %s
+    """
+    params_list: List[Any] = [PRESENCE_TTL, user_id, user_id, user_id]
+    
+    if country:
+        query += " AND lower(u.country) = %s"
+        params_list.append(country)
+    
+    if region:
+        query += " AND lower(u.region) = %s"
+        params_list.append(region)
+    
+    if cursor:
+        try:
+            sort_key, last_id = decode_cursor(cursor, 2)
+        except ValueError as e:
+            return bad_request(str(e))
+        query += " AND (u.last_seen, u.id) < (%s::timestamp, %s::int)"
+        params_list.extend([sort_key, last_id])
+    
+    query += " ORDER BY u.last_seen DESC NULLS LAST, u.id DESC LIMIT %s"
+    params_list.append(limit + 1)
+    
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=TimedCursor)
+    cur.execute(query, tuple(params_list))
+    matches = cur.fetchall()
+    cur.close()
+    release_db_connection(conn)
+    
+    headers = cors_headers()
+    if len(matches) > limit:
+        matches = matches[:limit]
+        last = matches[-1]
+        if last['sort_key'] is not None:
+            headers['X-Next-Cursor'] = encode_cursor(last['sort_key'], last['id'])
     
-    cur.close()
-    conn.close()
+    mark_buffered_online(matches)
+    for match in matches:
+        match.pop('sort_key')
     
     return {
         'statusCode': 200,
-        'headers': cors_headers(),
-        'body': json.dumps(users),
+        'headers': headers,
+        'body': to_json(matches),
         'isBase64Encoded': False
     }
 
 def get_user_profile(event: Dict[str, Any]) -> Dict[str, Any]:
-    user_id = event.get('pathParameters', {}).get('id')
+    user_id = (event.get('pathParameters') or {}).get('id')
     if not user_id:
         params = event.get('queryStringParameters', {}) or {}
         user_id = params.get('id')
     
     conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = conn.cursor(cursor_factory=TimedCursor)
     
-    cur.execute("""
+    cur.execute(f"""
         SELECT id, email, name, avatar, native_language, learning_language,
                level, xp, country, is_vip, vip_badge, avatar_frame, coins,
-               streak_days, total_messages, words_learned, gifts_received
+               streak_days, {message_total_sql()} AS total_messages, words_learned, gifts_received
         FROM users WHERE id = %s
     """, (user_id,))
     
     user = cur.fetchone()
     cur.close()
-    conn.close()
+    release_db_connection(conn)
     
     if not user:
         return {
             'statusCode': 404,
             'headers': cors_headers(),
-            'body': json.dumps({'error': 'User not found'}),
+            'body': to_json({'error': 'User not found'}),
             'isBase64Encoded': False
         }
     
     return {
         'statusCode': 200,
         'headers': cors_headers(),
-        'body': json.dumps(dict(user)),
+        'body': to_json(user),
         'isBase64Encoded': False
     }
 
 def update_user(event: Dict[str, Any]) -> Dict[str, Any]:
-    user_id = event.get('pathParameters', {}).get('id')
+    user_id = (event.get('pathParameters') or {}).get('id')
+    if not user_id:
+        params = event.get('queryStringParameters', {}) or {}
+        user_id = params.get('id')
     body = json.loads(event.get('body', '{}'))
     
     conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = conn.cursor(cursor_factory=TimedCursor)
     
     update_fields = []
     values = []
@@ -297,49 +1519,78 @@ def update_user(event: Dict[str, Any]) -> Dict[str, Any]:
         user = None
     
     cur.close()
-    conn.close()
+    release_db_connection(conn)
     
     return {
         'statusCode': 200,
         'headers': cors_headers(),
-        'body': json.dumps(dict(user) if user else {}),
+        'body': to_json(user or {}),
         'isBase64Encoded': False
     }
 
+CHATS_PAGE_MAX = 200
+
+def fetch_user_chats(cur, user_id: Any, changed: Optional[Tuple[str, List[str]]] = None,
+                     limit: Optional[int] = None, cursor: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Chat list read through chat_members, which has one row per member so both sides of a
+    chat hit the same (user_id, last_message_time DESC, chat_id DESC) index. The index
+    includes the preview and counters, so the list is an index-only scan plus partner lookups.
+    """
+    query = """
+        SELECT cm.chat_id as id, cm.last_message, cm.last_message_time,
+               cm.unread_count,
+               u.id as partner_id, u.name as partner_name, u.avatar as partner_avatar,
+               u.is_vip as partner_vip, u.vip_badge as partner_badge
+        FROM chat_members cm
+        JOIN users u ON u.id = cm.partner_id
+        WHERE cm.user_id = %s
+    """
+    params_list: List[Any] = [user_id]
+    
+    if changed:
+        query += " AND (cm.xact_id >= %s::xid8 OR cm.xact_id = ANY(%s::xid8[]))"
+        params_list.extend(changed)
+    
+    if cursor:
+        query += " AND (cm.last_message_time, cm.chat_id) < (%s::timestamp, %s::int)"
+        params_list.extend(cursor)
+    
+    query += " ORDER BY cm.last_message_time DESC, cm.chat_id DESC"
+    
+    if limit is not None:
+        query += " LIMIT %s"
+        params_list.append(limit)
+    
+    cur.execute(query, tuple(params_list))
+    return cur.fetchall()
+
 def get_user_chats(event: Dict[str, Any]) -> Dict[str, Any]:
     params = event.get('queryStringParameters', {}) or {}
     user_id = params.get('userId')
+    limit = min(int(params['limit']), CHATS_PAGE_MAX) if params.get('limit') else None
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        cursor = decode_cursor(params['cursor'], 2) if params.get('cursor') else None
+    except ValueError as e:
+        return bad_request(str(e))
     
-    cur.execute("""
-        SELECT c.id, c.last_message, c.last_message_time,
-               CASE 
-                   WHEN c.user1_id = %s THEN c.unread_count_user1
-                   ELSE c.unread_count_user2
-               END as unread_count,
-               u.id as partner_id, u.name as partner_name, u.avatar as partner_avatar,
-               u.is_vip as partner_vip, u.vip_badge as partner_badge
-        FROM chats c
-        JOIN users u ON (
-            CASE 
-                WHEN c.user1_id = %s THEN c.user2_id = u.id
-                ELSE c.user1_id = u.id
-            END
-        )
-        WHERE c.user1_id = %s OR c.user2_id = %s
-        ORDER BY c.last_message_time DESC
-    """, (user_id, user_id, user_id, user_id))
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=TimedCursor)
     
-    chats = cur.fetchall()
+    chats = fetch_user_chats(cur, user_id, limit=limit + 1 if limit else None, cursor=cursor)
     cur.close()
-    conn.close()
+    release_db_connection(conn)
+    
+    headers = cors_headers()
+    if limit and len(chats) > limit:
+        chats = chats[:limit]
+        headers['X-Next-Cursor'] = encode_cursor(chats[-1]['last_message_time'], chats[-1]['id'])
     
     return {
         'statusCode': 200,
-        'headers': cors_headers(),
-        'body': json.dumps([dict(c) for c in chats]),
+        'headers': headers,
+        'body': to_json(chats),
         'isBase64Encoded': False
     }
 
@@ -349,7 +1600,7 @@ def create_chat(event: Dict[str, Any]) -> Dict[str, Any]:
     user2_id = body['user2Id']
     
     conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = conn.cursor(cursor_factory=TimedCursor)
     
     cur.execute("""
         SELECT id FROM chats 
@@ -362,95 +1613,695 @@ def create_chat(event: Dict[str, Any]) -> Dict[str, Any]:
         chat_id = existing['id']
     else:
         cur.execute("""
-            INSERT INTO chats (user1_id, user2_id, last_message)
-            VALUES (%s, %s, 'Начните общение!')
-            RETURNING id
+            WITH new_chat AS (
+                INSERT INTO chats (user1_id, user2_id, last_message)
+                VALUES (%s, %s, 'Начните общение!')
+                RETURNING id, user1_id, user2_id, last_message, last_message_time
+            ), members AS (
+                INSERT INTO chat_members (chat_id, user_id, partner_id, last_message, last_message_time)
+                SELECT id, user1_id, user2_id, last_message, last_message_time FROM new_chat
+                UNION ALL
+                SELECT id, user2_id, user1_id, last_message, last_message_time FROM new_chat
+                ON CONFLICT DO NOTHING
+            )
+            SELECT id FROM new_chat
         """, (user1_id, user2_id))
         chat_id = cur.fetchone()['id']
         conn.commit()
     
     cur.close()
-    conn.close()
+    release_db_connection(conn)
     
     return {
         'statusCode': 201,
         'headers': cors_headers(),
-        'body': json.dumps({'chatId': chat_id}),
+        'body': to_json({'chatId': chat_id}),
         'isBase64Encoded': False
     }
 
+MESSAGES_PAGE_MAX = 200
+
 def get_chat_messages(event: Dict[str, Any]) -> Dict[str, Any]:
     params = event.get('queryStringParameters', {}) or {}
     chat_id = params.get('chatId')
-    limit = int(params.get('limit', 50))
-    
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    limit = min(int(params.get('limit', 50)), MESSAGES_PAGE_MAX)
+    before = params.get('before')
+    after = params.get('after')
     
-    cur.execute("""
+    query = """
         SELECT m.id, m.message, m.translated_message, m.is_voice, 
                m.voice_transcription, m.created_at, m.sender_id,
                u.name as sender_name, u.avatar as sender_avatar
         FROM messages m
         JOIN users u ON m.sender_id = u.id
         WHERE m.chat_id = %s
-        ORDER BY m.created_at DESC
-        LIMIT %s
-    """, (chat_id, limit))
+    """
+    params_list: List[Any] = [chat_id]
+    
+    try:
+        if after:
+            created_at, message_id = decode_cursor(after, 2)
+            query += " AND (m.created_at, m.id) > (%s::timestamp, %s::int) ORDER BY m.created_at ASC, m.id ASC"
+            params_list.extend([created_at, message_id])
+        elif before:
+            created_at, message_id = decode_cursor(before, 2)
+            query += " AND (m.created_at, m.id) < (%s::timestamp, %s::int) ORDER BY m.created_at DESC, m.id DESC"
+            params_list.extend([created_at, message_id])
+        else:
+            query += " ORDER BY m.created_at DESC, m.id DESC"
+    except ValueError as e:
+        return bad_request(str(e))
+    
+    query += " LIMIT %s"
+    params_list.append(limit + 1)
+    
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=TimedCursor)
+    
+    cur.execute(query, tuple(params_list))
     
     messages = cur.fetchall()
     cur.close()
-    conn.close()
+    release_db_connection(conn)
+    
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if not after:
+        messages.reverse()
+    
+    # nextCursor pages back into older history; latestCursor polls for newer messages.
+    next_cursor = None
+    if messages and (has_more or after):
+        next_cursor = encode_cursor(messages[0]['created_at'], messages[0]['id'])
+    latest_cursor = encode_cursor(messages[-1]['created_at'], messages[-1]['id']) if messages else after
     
     return {
         'statusCode': 200,
         'headers': cors_headers(),
-        'body': json.dumps([dict(m) for m in reversed(messages)]),
+        'body': to_json({
+            'messages': messages,
+            'nextCursor': next_cursor,
+            'latestCursor': latest_cursor,
+            'hasMore': has_more
+        }),
         'isBase64Encoded': False
     }
 
-def send_message(event: Dict[str, Any]) -> Dict[str, Any]:
-    body = json.loads(event.get('body', '{}'))
+EXPORT_FETCH_SIZE = int(os.environ.get('EXPORT_FETCH_SIZE', '2000'))
+EXPORT_MAX_BYTES = int(os.environ.get('EXPORT_MAX_BYTES', str(4 * 1024 * 1024)))
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson; charset=utf-8', 'csv': 'text/csv; charset=utf-8'}
+EXPORT_COLUMNS = ('id', 'created_at', 'sender_id', 'sender_name', 'message', 'translated_message', 'is_voice')
+
+def export_chat(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Chat history in id order as NDJSON or CSV, read through a named (server-side) cursor
+    EXPORT_FETCH_SIZE rows per round trip. A response carries at most EXPORT_MAX_BYTES;
+    when more history remains, X-Next-Cursor holds the last exported message id to pass
+    back as afterId, so memory stays bounded however long the chat is.
+    """
+    import csv
+    import io
+    
+    params = event.get('queryStringParameters', {}) or {}
+    chat_id = params.get('chatId')
+    export_format = params.get('format', 'ndjson')
+    after_id = params.get('afterId')
+    
+    if export_format not in EXPORT_FORMATS:
+        return bad_request(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if after_id is not None and not after_id.isdigit():
+        return bad_request('Invalid afterId')
     
     conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = conn.cursor(cursor_factory=TimedCursor)
     
+    # Two rows; resolving names up front keeps the streamed query a plain index scan.
     cur.execute("""
-        INSERT INTO messages (chat_id, sender_id, message, translated_message, is_voice)
-        VALUES (%s, %s, %s, %s, %s)
-        RETURNING id, message, translated_message, created_at
-    """, (
-        body['chatId'],
-        body['senderId'],
-        body['message'],
-        body.get('translatedMessage'),
-        body.get('isVoice', False)
-    ))
+        SELECT u.id, u.name FROM chat_members cm
+        JOIN users u ON u.id = cm.user_id
+        WHERE cm.chat_id = %s
+    """, (chat_id,))
+    names = {row['id']: row['name'] for row in cur.fetchall()}
+    cur.close()
     
-    message = cur.fetchone()
+    query = """
+        SELECT id, created_at, sender_id, message, translated_message, is_voice
+        FROM messages
+        WHERE chat_id = %s
+    """
+    params_list: List[Any] = [chat_id]
+    if after_id:
+        query += " AND (created_at, id) > (SELECT created_at, id FROM messages WHERE id = %s)"
+        params_list.append(int(after_id))
+    query += " ORDER BY created_at, id"
+    
+    stream = conn.cursor(name='chat_export', cursor_factory=TimedCursor)
+    stream.itersize = EXPORT_FETCH_SIZE
+    stream.execute(query, tuple(params_list))
+    
+    chunks: List[str] = []
+    size = 0
+    last_id = None
+    next_cursor = None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == 'csv' and not after_id:
+        writer.writerow(EXPORT_COLUMNS)
+        chunks.append(buffer.getvalue())
+        size += len(chunks[-1])
+    
+    for row in stream:
+        row['sender_name'] = names.get(row['sender_id'])
+        if export_format == 'csv':
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow([
+                row['created_at'].isoformat() if column == 'created_at' else row[column]
+                for column in EXPORT_COLUMNS
+            ])
+            line = buffer.getvalue()
+        else:
+            line = to_json(row) + '\n'
+        line_size = len(line.encode('utf-8'))
+        if size + line_size > EXPORT_MAX_BYTES and last_id is not None:
+            next_cursor = str(last_id)
+            break
+        chunks.append(line)
+        size += line_size
+        last_id = row['id']
+    
+    stream.close()
+    conn.rollback()
+    release_db_connection(conn)
+    
+    headers = dict(cors_headers(), **{
+        'Content-Type': EXPORT_FORMATS[export_format],
+        'Content-Disposition': f'attachment; filename="chat-{chat_id}.{export_format}"',
+    })
+    if next_cursor:
+        headers['X-Next-Cursor'] = next_cursor
     
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': ''.join(chunks),
+        'isBase64Encoded': False
+    }
+
+SYNC_CHANNEL_PREFIX = 'sync_user_'
+SYNC_MAX_WAIT = float(os.environ.get('SYNC_MAX_WAIT', '20'))
+SYNC_MESSAGES_MAX = 200
+
+def sync_snapshot(cur) -> Tuple[str, List[str]]:
+    """
+    xmax and in-progress xids of the transaction snapshot: rows of any other transaction below
+    xmax are already visible, the in-progress ones become visible later with their old xid.
+    """
     cur.execute("""
-        UPDATE chats 
-        SET last_message = %s, last_message_time = CURRENT_TIMESTAMP,
-            unread_count_user1 = CASE WHEN user1_id != %s THEN unread_count_user1 + 1 ELSE unread_count_user1 END,
-            unread_count_user2 = CASE WHEN user2_id != %s THEN unread_count_user2 + 1 ELSE unread_count_user2 END
-        WHERE id = %s
-    """, (body['message'], body['senderId'], body['senderId'], body['chatId']))
-    
+        SELECT pg_snapshot_xmax(s)::text AS xmax, ARRAY(SELECT x::text FROM pg_snapshot_xip(s) x) AS xip
+        FROM pg_current_snapshot() s
+    """)
+    row = cur.fetchone()
+    return row['xmax'], row['xip']
+
+def fetch_sync_deltas(conn, cur, user_id: Any, position: List[str]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[str]]:
+    """
+    position is [xmax, message_id, xip]: everything below xmax except the comma-separated
+    xip transactions was delivered, and at xmax itself messages up to message_id. Reads run in
+    one REPEATABLE READ snapshot, and the position returned is that snapshot, so writers still
+    in flight are picked up by the next poll no matter how long other transactions stay open.
+    """
+    xmax, message_id, xip = position[0], position[1], [x for x in position[2].split(',') if x]
+    cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+    snapshot_xmax, snapshot_xip = sync_snapshot(cur)
     cur.execute("""
-        UPDATE users 
-        SET total_messages = total_messages + 1
-        WHERE id = %s
-    """, (body['senderId'],))
+        SELECT m.id, m.chat_id, m.message, m.translated_message, m.is_voice,
+               m.voice_transcription, m.created_at, m.sender_id, m.xact_id::text AS xact_id,
+               u.name as sender_name, u.avatar as sender_avatar
+        FROM messages m
+        JOIN users u ON m.sender_id = u.id
+        WHERE ((m.xact_id, m.id) > (%s::xid8, %s::int) OR m.xact_id = ANY(%s::xid8[]))
+          AND m.chat_id IN (SELECT chat_id FROM chat_members WHERE user_id = %s)
+        ORDER BY m.xact_id, m.id
+        LIMIT %s
+    """, (xmax, message_id, xip, user_id, SYNC_MESSAGES_MAX))
+    messages = cur.fetchall()
+    chats = fetch_user_chats(cur, user_id, changed=(xmax, xip))
+    conn.commit()
+    
+    if len(messages) >= SYNC_MESSAGES_MAX:
+        # Stop inside the page: its last transaction is committed, older in-flight ones stay pending.
+        last = messages[-1]
+        pending = [x for x in snapshot_xip if int(x) < int(last['xact_id'])]
+        position = [last['xact_id'], last['id'], ','.join(pending)]
+    else:
+        position = [snapshot_xmax, 0, ','.join(snapshot_xip)]
+    for message in messages:
+        message.pop('xact_id')
+    return messages, chats, position
+
+def wait_for_notify(conn, timeout: float) -> bool:
+    """Blocks until a NOTIFY arrives on a LISTENed channel or the timeout expires."""
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        if select.select([conn], [], [], remaining) == ([], [], []):
+            return False
+        conn.poll()
+        if conn.notifies:
+            del conn.notifies[:]
+            return True
+
+def sync_updates(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Incremental sync: returns messages and chats written since the opaque cursor. The cursor
+    is a snapshot of transaction ids (see fetch_sync_deltas), so a message whose id was taken
+    before a newer one but committed after it is still delivered. With wait > 0 and nothing
+    new, LISTENs for send_message notifications up to SYNC_MAX_WAIT seconds.
+    """
+    params = event.get('queryStringParameters', {}) or {}
+    user_id = params.get('userId')
+    wait = min(float(params.get('wait', 0) or 0), SYNC_MAX_WAIT)
+    
+    try:
+        position = decode_cursor(params['cursor'], 3) if params.get('cursor') else None
+    except ValueError as e:
+        return bad_request(str(e))
+    
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=TimedCursor)
+    
+    if position is None:
+        # First sync only establishes the baseline; the client already loaded full state.
+        messages, chats = [], []
+        xmax, xip = sync_snapshot(cur)
+        conn.commit()
+        position = [xmax, 0, ','.join(xip)]
+    else:
+        if wait > 0:
+            # LISTEN before reading so a message committed in between still wakes us up.
+            cur.execute(f"LISTEN {SYNC_CHANNEL_PREFIX}{int(user_id)}")
+            conn.commit()
+            try:
+                messages, chats, latest = fetch_sync_deltas(conn, cur, user_id, position)
+                if not messages and not chats and wait_for_notify(conn, wait):
+                    messages, chats, latest = fetch_sync_deltas(conn, cur, user_id, position)
+                position = latest
+            finally:
+                conn.rollback()
+                cur.execute("UNLISTEN *")
+                conn.commit()
+        else:
+            messages, chats, position = fetch_sync_deltas(conn, cur, user_id, position)
+    
+    cur.close()
+    release_db_connection(conn)
+    
+    return {
+        'statusCode': 200,
+        'headers': cors_headers(),
+        'body': to_json({
+            'messages': messages,
+            'chats': chats,
+            'cursor': encode_cursor(*position),
+            'hasMore': len(messages) >= SYNC_MESSAGES_MAX
+        }),
+        'isBase64Encoded': False
+    }
+
+MESSAGE_COUNTER_MODE = os.environ.get('MESSAGE_COUNTER_MODE', 'immediate')
+COUNTER_FOLD_BATCH = int(os.environ.get('COUNTER_FOLD_BATCH', '10000'))
+COUNTER_FOLD_LOCK = 0x6d736763
+
+def message_total_sql(users_alias: str = 'users') -> str:
+    """users.total_messages plus increments still waiting in user_message_deltas."""
+    return f"""({users_alias}.total_messages + COALESCE((
+        SELECT SUM(d.delta) FROM user_message_deltas d WHERE d.user_id = {users_alias}.id
+    ), 0))"""
+
+def send_message(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Inserts the message and applies all of its side effects in one statement: chat previews,
+    unread counters, the translation job, the sender's message counter, 'messages'
+    achievements and sync notifications. With MESSAGE_COUNTER_MODE=deferred the counter
+    increment is appended to user_message_deltas instead of updating the sender's users row.
+    """
+    body = json.loads(event.get('body', '{}'))
+    
+    if MESSAGE_COUNTER_MODE == 'deferred':
+        counter = f"""delta AS (
+            INSERT INTO user_message_deltas (user_id, delta) VALUES (%(sender_id)s, 1)
+        ), counter AS (
+            SELECT {message_total_sql()} + 1 AS total FROM users WHERE id = %(sender_id)s
+        )"""
+    else:
+        counter = """counter AS (
+            UPDATE users SET total_messages = total_messages + 1
+            WHERE id = %(sender_id)s
+            RETURNING total_messages AS total
+        )"""
+    achievements = achievement_progress_sql(
+        "LEAST(a.requirement_value, GREATEST(ua.progress, (SELECT total FROM counter)))"
+    )
+    
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=TimedCursor)
+    
+    # pg_notify wakes up long-polling sync requests of both members once the transaction commits.
+    cur.execute(f"""
+        WITH msg AS (
+            INSERT INTO messages (chat_id, sender_id, message, translated_message, is_voice)
+            VALUES (%(chat_id)s, %(sender_id)s, %(message)s, %(translated_message)s, %(is_voice)s)
+            RETURNING id, message, translated_message, created_at
+        ), updated AS (
+            UPDATE chats 
+            SET last_message = %(message)s, last_message_time = CURRENT_TIMESTAMP,
+                unread_count_user1 = CASE WHEN user1_id != %(sender_id)s THEN unread_count_user1 + 1 ELSE unread_count_user1 END,
+                unread_count_user2 = CASE WHEN user2_id != %(sender_id)s THEN unread_count_user2 + 1 ELSE unread_count_user2 END
+            WHERE id = %(chat_id)s
+        ), members AS (
+            UPDATE chat_members
+            SET last_message = LEFT(%(message)s, 200), last_message_time = CURRENT_TIMESTAMP,
+                xact_id = pg_current_xact_id(),
+                unread_count = CASE WHEN user_id != %(sender_id)s THEN unread_count + 1 ELSE unread_count END
+            WHERE chat_id = %(chat_id)s
+            RETURNING user_id, partner_id
+        ), jobs AS (
+            INSERT INTO translation_jobs (message_id, target_lang)
+            SELECT msg.id, recipient.native_language
+            FROM msg, members
+            JOIN users sender ON sender.id = members.user_id
+            JOIN users recipient ON recipient.id = members.partner_id
+            WHERE members.user_id = %(sender_id)s
+              AND %(translated_message)s::text IS NULL
+              AND recipient.native_language <> sender.native_language
+            ON CONFLICT (message_id, target_lang) DO NOTHING
+        ), {counter}, advanced AS (
+            {achievements}
+        )
+        SELECT msg.id, msg.message, msg.translated_message, msg.created_at,
+               COALESCE((
+                   SELECT json_agg(json_build_object('user_id', user_id, 'id', id, 'name', name, 'icon', icon))
+                   FROM advanced WHERE unlocked
+               ), '[]') AS unlocked_achievements,
+               (SELECT COUNT(*) FROM members, pg_notify(%(channel_prefix)s || members.user_id, msg.id::text)) AS notified
+        FROM msg
+    """, {
+        'chat_id': body['chatId'],
+        'sender_id': body['senderId'],
+        'message': body['message'],
+        'translated_message': body.get('translatedMessage'),
+        'is_voice': body.get('isVoice', False),
+        'achievement_users': [int(body['senderId'])],
+        'requirement_type': 'messages',
+        'channel_prefix': SYNC_CHANNEL_PREFIX,
+    })
+    
+    message = cur.fetchone()
+    message['unlockedAchievements'] = message.pop('unlocked_achievements')
+    message.pop('notified')
     
     conn.commit()
     cur.close()
-    conn.close()
+    release_db_connection(conn)
     
     return {
         'statusCode': 201,
         'headers': cors_headers(),
-        'body': json.dumps(dict(message)),
+        'body': to_json(message),
+        'isBase64Encoded': False
+    }
+
+def fold_message_counters(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Timer entry point for MESSAGE_COUNTER_MODE=deferred: moves up to COUNTER_FOLD_BATCH pending
+    increments into users.total_messages, one row update per sender. Runs are serialized by
+    an advisory lock so concurrent folds never contend for the same users rows. The trigger
+    must send X-Timer-Token; the route answers 403 otherwise.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=TimedCursor)
+    
+    cur.execute("SELECT pg_try_advisory_xact_lock(%s) AS locked", (COUNTER_FOLD_LOCK,))
+    if not cur.fetchone()['locked']:
+        conn.rollback()
+        cur.close()
+        release_db_connection(conn)
+        return {
+            'statusCode': 409,
+            'headers': cors_headers(),
+            'body': to_json({'error': 'Fold already running'}),
+            'isBase64Encoded': False
+        }
+    
+    cur.execute("""
+        WITH folded AS (
+            DELETE FROM user_message_deltas
+            WHERE id IN (SELECT id FROM user_message_deltas ORDER BY id LIMIT %s)
+            RETURNING user_id, delta
+        ), applied AS (
+            UPDATE users u
+            SET total_messages = u.total_messages + f.delta
+            FROM (SELECT user_id, SUM(delta) AS delta FROM folded GROUP BY user_id) f
+            WHERE u.id = f.user_id
+            RETURNING u.id
+        )
+        SELECT (SELECT COUNT(*) FROM folded) AS deltas, (SELECT COUNT(*) FROM applied) AS users
+    """, (COUNTER_FOLD_BATCH,))
+    result = cur.fetchone()
+    
+    conn.commit()
+    cur.close()
+    release_db_connection(conn)
+    
+    return {
+        'statusCode': 200,
+        'headers': cors_headers(),
+        'body': to_json({'folded': result['deltas'], 'users': result['users']}),
+        'isBase64Encoded': False
+    }
+
+def achievement_progress_sql(progress: str, condition: str = 'TRUE') -> str:
+    """
+    UPDATE of locked user_achievements rows of %(requirement_type)s for %(achievement_users)s,
+    setting progress to the given expression; usable alone or as a CTE of a larger statement.
+    """
+    return f"""
+        UPDATE user_achievements ua
+        SET progress = {progress},
+            unlocked = {progress} >= a.requirement_value,
+            unlocked_at = CASE WHEN {progress} >= a.requirement_value THEN CURRENT_TIMESTAMP END
+        FROM achievements a
+        WHERE ua.achievement_id = a.id
+          AND ua.user_id = ANY(%(achievement_users)s)
+          AND a.requirement_type = %(requirement_type)s
+          AND NOT ua.unlocked
+          AND {condition}
+        RETURNING ua.user_id, a.id, a.name, a.icon, ua.unlocked
+    """
+
+def advance_achievements(cur, user_ids: List[Any], requirement_type: str,
+                         value: Optional[int] = None, delta: int = 0) -> List[Dict[str, Any]]:
+    """
+    Moves progress of the given users' locked achievements of one requirement_type, inside
+    the caller's transaction. Pass value for counters read back from users (messages, words,
+    level, streak) and delta for events counted nowhere else (friends, gifts).
+    Only the touched users' rows are read. Returns the achievements this call unlocked.
+    """
+    if value is not None:
+        progress = "LEAST(a.requirement_value, GREATEST(ua.progress, %(amount)s))"
+        amount = value
+    else:
+        progress = "LEAST(a.requirement_value, ua.progress + %(amount)s)"
+        amount = delta
+    
+    cur.execute(achievement_progress_sql(progress), {
+        'amount': amount,
+        'achievement_users': [int(u) for u in user_ids],
+        'requirement_type': requirement_type,
+    })
+    
+    return [
+        {'user_id': row['user_id'], 'id': row['id'], 'name': row['name'], 'icon': row['icon']}
+        for row in cur.fetchall() if row['unlocked']
+    ]
+
+def load_achievement_catalog(cur) -> List[Dict[str, Any]]:
+    cur.execute("""
+        SELECT id, name, description, icon, requirement_type, requirement_value
+        FROM achievements ORDER BY id
+    """)
+    return cur.fetchall()
+
+TRANSLATE_FUNCTION_URL = os.environ.get(
+    'TRANSLATE_FUNCTION_URL', 'https://functions.poehali.dev/3be83a8b-27f0-4188-97d6-de6fc278ad0e'
+)
+TRANSLATION_WORKER_BATCH = int(os.environ.get('TRANSLATION_WORKER_BATCH', '100'))
+TRANSLATION_WORKER_BUDGET = float(os.environ.get('TRANSLATION_WORKER_BUDGET', '20'))
+# Not configurable: idx_translation_jobs_pending (V0020) is partial on attempts < 5, and the
+# claim query can only use it while this matches.
+TRANSLATION_JOB_MAX_ATTEMPTS = 5
+# How long a claimed job stays invisible to other workers; covers the whole worker budget.
+TRANSLATION_JOB_LEASE = TRANSLATION_WORKER_BUDGET + 10
+# Sent as X-Internal-Token so the translate function doesn't rate-limit the worker.
+TRANSLATE_INTERNAL_TOKEN = os.environ.get('TRANSLATE_INTERNAL_TOKEN', '')
+
+class TranslateThrottled(Exception):
+    """The translate function answered 429; the remaining jobs wait for the next run."""
+
+# users.native_language stores display names; the provider expects ISO 639-1 codes.
+# Mirrored by the language_code() SQL function behind users.native_code/learning_code (V0023).
+LANGUAGE_CODES = {
+    'english': 'en', 'английский': 'en',
+    'russian': 'ru', 'русский': 'ru',
+    'spanish': 'es', 'español': 'es', 'испанский': 'es',
+    'french': 'fr', 'français': 'fr', 'французский': 'fr',
+    'german': 'de', 'deutsch': 'de', 'немецкий': 'de',
+    'italian': 'it', 'italiano': 'it', 'итальянский': 'it',
+    'portuguese': 'pt', 'português': 'pt', 'португальский': 'pt',
+    'chinese': 'zh', '中文': 'zh', 'китайский': 'zh',
+    'japanese': 'ja', '日本語': 'ja', 'японский': 'ja',
+    'korean': 'ko', '한국어': 'ko', 'корейский': 'ko',
+    'arabic': 'ar', 'العربية': 'ar', 'арабский': 'ar',
+}
+
+def language_code(language: str) -> Optional[str]:
+    return LANGUAGE_CODES.get((language or '').strip().lower())
+
+def request_translations(texts: List[str], target_lang: str, deadline_ms: int) -> List[Optional[str]]:
+    """Translates texts with one batch call to the translate function; None marks a fallback."""
+    import urllib.request
+    
+    data = json.dumps({'texts': texts, 'targetLang': target_lang, 'deadlineMs': deadline_ms}).encode('utf-8')
+    headers = {'Content-Type': 'application/json'}
+    if TRANSLATE_INTERNAL_TOKEN:
+        headers['X-Internal-Token'] = TRANSLATE_INTERNAL_TOKEN
+    req = urllib.request.Request(TRANSLATE_FUNCTION_URL, data=data, method='POST', headers=headers)
+    with urllib.request.urlopen(req, timeout=deadline_ms / 1000 + 2) as response:
+        result = json.loads(response.read().decode('utf-8'))
+    return [None if t.get('fallback') else t['translated'] for t in result['translations']]
+
+def process_translation_batch(conn, cur, deadline: float) -> int:
+    """
+    Claims up to TRANSLATION_WORKER_BATCH jobs in a short transaction that counts the attempt
+    and leases them until claimed_until, translates them with no transaction open (one
+    upstream batch per target language), then writes translated_message back in a second
+    short transaction. A crashed worker's jobs become claimable again once the lease expires.
+    Jobs that can never succeed (unknown language, or TRANSLATION_JOB_MAX_ATTEMPTS reached)
+    are deleted, leaving the message untranslated, so they never pile up at the head of the
+    queue. Returns jobs claimed; raises TranslateThrottled after writing back when the
+    translate function rate-limited a group, returning that group's and later groups'
+    attempts.
+    """
+    cur.execute("""
+        WITH claimed AS (
+            UPDATE translation_jobs j
+            SET attempts = j.attempts + 1, last_attempt_at = CURRENT_TIMESTAMP,
+                claimed_until = CURRENT_TIMESTAMP + make_interval(secs => %s)
+            FROM (
+                SELECT id FROM translation_jobs
+                WHERE attempts < %s AND (claimed_until IS NULL OR claimed_until < CURRENT_TIMESTAMP)
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            ) next_jobs
+            WHERE j.id = next_jobs.id
+            RETURNING j.id, j.message_id, j.target_lang, j.attempts
+        )
+        SELECT c.id, c.message_id, c.target_lang, c.attempts, m.message
+        FROM claimed c
+        JOIN messages m ON m.id = c.message_id
+        ORDER BY c.id
+    """, (TRANSLATION_JOB_LEASE, TRANSLATION_JOB_MAX_ATTEMPTS, TRANSLATION_WORKER_BATCH))
+    jobs = cur.fetchall()
+    conn.commit()
+    if not jobs:
+        return 0
+    
+    by_language: Dict[str, List[Dict[str, Any]]] = {}
+    for job in jobs:
+        by_language.setdefault(job['target_lang'], []).append(job)
+    
+    done: List[Tuple[int, int, str]] = []
+    failed: List[int] = []
+    dropped: List[int] = []
+    skipped: List[int] = []
+    throttled = False
+    for language, group in by_language.items():
+        code = language_code(language)
+        if code is None:
+            dropped.extend(job['id'] for job in group)
+            continue
+        budget_ms = int((deadline - time.monotonic()) * 1000)
+        if throttled or budget_ms <= 0:
+            skipped.extend(job['id'] for job in group)
+            continue
+        try:
+            translations = request_translations([job['message'] for job in group], code, budget_ms)
+        except Exception as e:
+            if getattr(e, 'code', None) == 429:
+                throttled = True
+                skipped.extend(job['id'] for job in group)
+                continue
+            translations = [None] * len(group)
+        for job, translated in zip(group, translations):
+            if translated is None:
+                (dropped if job['attempts'] >= TRANSLATION_JOB_MAX_ATTEMPTS else failed).append(job['id'])
+            else:
+                done.append((job['id'], job['message_id'], translated))
+    
+    if done:
+        psycopg2.extras.execute_values(cur, """
+            UPDATE messages SET translated_message = v.translated
+            FROM (VALUES %s) AS v(id, translated)
+            WHERE messages.id = v.id AND messages.translated_message IS NULL
+        """, [(message_id, translated) for _, message_id, translated in done])
+    if done or dropped:
+        cur.execute("DELETE FROM translation_jobs WHERE id = ANY(%s)", ([job_id for job_id, _, _ in done] + dropped,))
+    if failed:
+        cur.execute("UPDATE translation_jobs SET claimed_until = NULL WHERE id = ANY(%s)", (failed,))
+    if skipped:
+        # Never sent upstream: give the attempt back.
+        cur.execute(
+            "UPDATE translation_jobs SET attempts = attempts - 1, claimed_until = NULL WHERE id = ANY(%s)",
+            (skipped,)
+        )
+    conn.commit()
+    if throttled:
+        raise TranslateThrottled()
+    return len(jobs)
+
+def process_translation_jobs(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Worker entry point for the timer trigger, which must send X-Timer-Token (the route answers
+    403 otherwise): drains the queue within TRANSLATION_WORKER_BUDGET seconds.
+    """
+    deadline = time.monotonic() + TRANSLATION_WORKER_BUDGET
+    
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=TimedCursor)
+    
+    processed = 0
+    throttled = False
+    while time.monotonic() < deadline:
+        try:
+            claimed = process_translation_batch(conn, cur, deadline)
+        except TranslateThrottled:
+            throttled = True
+            break
+        processed += claimed
+        if claimed < TRANSLATION_WORKER_BATCH:
+            break
+    
+    cur.close()
+    release_db_connection(conn)
+    
+    return {
+        'statusCode': 200,
+        'headers': cors_headers(),
+        'body': to_json({'processed': processed, 'throttled': throttled}),
         'isBase64Encoded': False
     }
 
@@ -458,37 +2309,45 @@ def get_user_achievements(event: Dict[str, Any]) -> Dict[str, Any]:
     params = event.get('queryStringParameters', {}) or {}
     user_id = params.get('userId')
     
+    if not user_id:
+        catalog = cached_catalog('achievements', (), load_achievement_catalog)
+        return conditional_response(event, catalog['body'], catalog['etag'], public_cache_control())
+    
     conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = conn.cursor(cursor_factory=TimedCursor)
+    
+    definitions = {a['id']: a for a in cached_catalog('achievements', (), load_achievement_catalog, cur)['data']}
     
     cur.execute("""
-        SELECT a.id, a.name, a.description, a.icon, 
-               ua.progress, ua.unlocked, a.requirement_value
-        FROM user_achievements ua
-        JOIN achievements a ON ua.achievement_id = a.id
-        WHERE ua.user_id = %s
+        SELECT achievement_id, progress, unlocked
+        FROM user_achievements
+        WHERE user_id = %s
+        ORDER BY achievement_id
     """, (user_id,))
     
     achievements = cur.fetchall()
     
     result = []
     for ach in achievements:
+        definition = definitions.get(ach['achievement_id'])
+        if definition is None:
+            continue
         result.append({
-            'id': ach['id'],
-            'name': ach['name'],
-            'description': ach['description'],
-            'icon': ach['icon'],
+            'id': definition['id'],
+            'name': definition['name'],
+            'description': definition['description'],
+            'icon': definition['icon'],
             'unlocked': ach['unlocked'],
-            'progress': int((ach['progress'] / ach['requirement_value']) * 100) if ach['requirement_value'] > 0 else 0
+            'progress': int((ach['progress'] / definition['requirement_value']) * 100) if definition['requirement_value'] > 0 else 0
         })
     
     cur.close()
-    conn.close()
+    release_db_connection(conn)
     
     return {
         'statusCode': 200,
         'headers': cors_headers(),
-        'body': json.dumps(result),
+        'body': to_json(result),
         'isBase64Encoded': False
     }
 
@@ -496,7 +2355,7 @@ def add_friend(event: Dict[str, Any]) -> Dict[str, Any]:
     body = json.loads(event.get('body', '{}'))
     
     conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = conn.cursor(cursor_factory=TimedCursor)
     
     cur.execute("""
         INSERT INTO friendships (user_id, friend_id, status)
@@ -507,57 +2366,81 @@ def add_friend(event: Dict[str, Any]) -> Dict[str, Any]:
     
     friendship = cur.fetchone()
     
+    unlocked = []
     if friendship:
         cur.execute("""
             INSERT INTO friendships (user_id, friend_id, status)
             VALUES (%s, %s, 'accepted')
             ON CONFLICT (user_id, friend_id) DO NOTHING
         """, (body['friendId'], body['userId']))
+        unlocked = advance_achievements(cur, [body['userId'], body['friendId']], 'friends', delta=1)
     
     conn.commit()
     cur.close()
-    conn.close()
+    release_db_connection(conn)
     
     return {
         'statusCode': 201,
         'headers': cors_headers(),
-        'body': json.dumps({'success': True}),
+        'body': to_json({
+            'success': True,
+            'unlockedAchievements': [a for a in unlocked if a['user_id'] == body['userId']]
+        }),
         'isBase64Encoded': False
     }
 
+def load_lesson_catalog(language: str) -> Callable[[Any], List[Dict[str, Any]]]:
+    def loader(cur) -> List[Dict[str, Any]]:
+        cur.execute("""
+            SELECT id, title, description, xp_reward, level_required
+            FROM lessons
+            WHERE language = %s
+            ORDER BY level_required, id
+        """, (language,))
+        return [dict(l, completed=False) for l in cur.fetchall()]
+    return loader
+
+def load_lesson_languages(cur) -> List[str]:
+    cur.execute("SELECT DISTINCT language FROM lessons")
+    return [row['language'] for row in cur.fetchall()]
+
 def get_lessons(event: Dict[str, Any]) -> Dict[str, Any]:
     params = event.get('queryStringParameters', {}) or {}
     language = params.get('language', 'English')
     user_id = params.get('userId')
     
+    # Only languages that have lessons get a cache entry; the rest have none to list.
+    if language not in cached_catalog('lessons', (), load_lesson_languages)['data']:
+        body = to_json([])
+        return conditional_response(event, body, make_etag(body), public_cache_control())
+    
+    if not user_id:
+        catalog = cached_catalog('lessons', (language,), load_lesson_catalog(language))
+        return conditional_response(event, catalog['body'], catalog['etag'], public_cache_control())
+    
     conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = conn.cursor(cursor_factory=TimedCursor)
     
-    cur.execute("""
-        SELECT l.id, l.title, l.description, l.xp_reward, l.level_required,
-               COALESCE(ul.completed, FALSE) as completed
-        FROM lessons l
-        LEFT JOIN user_lessons ul ON l.id = ul.lesson_id AND ul.user_id = %s
-        WHERE l.language = %s
-        ORDER BY l.level_required, l.id
-    """, (user_id, language))
-    
-    lessons = cur.fetchall()
+    catalog = cached_catalog('lessons', (language,), load_lesson_catalog(language), cur)
+    
+    cur.execute(
+        "SELECT lesson_id FROM user_lessons WHERE user_id = %s AND completed",
+        (user_id,)
+    )
+    completed = {row['lesson_id'] for row in cur.fetchall()}
     cur.close()
-    conn.close()
+    release_db_connection(conn)
     
-    return {
-        'statusCode': 200,
-        'headers': cors_headers(),
-        'body': json.dumps([dict(l) for l in lessons]),
-        'isBase64Encoded': False
-    }
+    lessons = [dict(l, completed=l['id'] in completed) for l in catalog['data']]
+    body = to_json(lessons)
+    
+    return conditional_response(event, body, make_etag(body), 'private, no-cache')
 
 def complete_lesson(event: Dict[str, Any]) -> Dict[str, Any]:
     body = json.loads(event.get('body', '{}'))
     
     conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = conn.cursor(cursor_factory=TimedCursor)
     
     cur.execute("""
         INSERT INTO user_lessons (user_id, lesson_id, completed, score, completed_at)
@@ -568,6 +2451,7 @@ def complete_lesson(event: Dict[str, Any]) -> Dict[str, Any]:
     
     cur.execute("SELECT xp_reward FROM lessons WHERE id = %s", (body['lessonId'],))
     lesson = cur.fetchone()
+    unlocked = []
     
     if lesson:
         cur.execute("""
@@ -576,88 +2460,332 @@ def complete_lesson(event: Dict[str, Any]) -> Dict[str, Any]:
                 level = CASE WHEN (xp + %s) >= level * 100 THEN level + 1 ELSE level END,
                 words_learned = words_learned + 10
             WHERE id = %s
-            RETURNING level, xp
+            RETURNING level, xp, words_learned
         """, (lesson['xp_reward'], lesson['xp_reward'], body['userId']))
         
         user = cur.fetchone()
+        unlocked = advance_achievements(cur, [body['userId']], 'words', value=user['words_learned'])
+        unlocked += advance_achievements(cur, [body['userId']], 'level', value=user['level'])
     
     conn.commit()
     cur.close()
-    conn.close()
+    release_db_connection(conn)
     
     return {
         'statusCode': 200,
         'headers': cors_headers(),
-        'body': json.dumps({'xp': lesson['xp_reward'], 'level': user['level'], 'totalXp': user['xp']}),
+        'body': to_json({
+            'xp': lesson['xp_reward'],
+            'level': user['level'],
+            'totalXp': user['xp'],
+            'unlockedAchievements': unlocked
+        }),
         'isBase64Encoded': False
     }
 
+GIFT_BULK_MAX = int(os.environ.get('GIFT_BULK_MAX', '100'))
+
 def send_gift(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Sends a gift to receiverId, or to every user in receiverIds, in one statement: the
+    sender's coins are debited only WHERE coins >= the total price, and the ledger rows,
+    receivers' gifts_received and the sender's 'gifts' achievements all chain off that
+    debit, so concurrent purchases can never overdraw. All involved users rows are locked
+    first, in id order, so opposite-direction gifts (A to B, B to A) cannot deadlock. Prices
+    come from the gift catalog cache.
+    """
     body = json.loads(event.get('body', '{}'))
+    sender_id = int(body['senderId'])
+    receiver_ids = body.get('receiverIds') or ([body['receiverId']] if body.get('receiverId') else [])
+    receiver_ids = list(dict.fromkeys(int(r) for r in receiver_ids))
+    
+    if not receiver_ids:
+        return bad_request('receiverId or receiverIds is required')
+    if len(receiver_ids) > GIFT_BULK_MAX:
+        return bad_request(f'At most {GIFT_BULK_MAX} receivers per request')
+    if sender_id in receiver_ids:
+        return bad_request('Cannot send a gift to yourself')
     
     conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = conn.cursor(cursor_factory=TimedCursor)
     
-    cur.execute("SELECT price FROM gifts WHERE id = %s", (body['giftId'],))
-    gift = cur.fetchone()
+    catalog = cached_catalog('gifts', (), load_gift_catalog, cur)
+    gift = next((g for g in catalog['data'] if g['id'] == int(body['giftId'])), None)
     
     if not gift:
         cur.close()
-        conn.close()
+        release_db_connection(conn)
         return {
             'statusCode': 404,
             'headers': cors_headers(),
-            'body': json.dumps({'error': 'Gift not found'}),
+            'body': to_json({'error': 'Gift not found'}),
             'isBase64Encoded': False
         }
     
-    cur.execute("SELECT coins FROM users WHERE id = %s", (body['senderId'],))
-    sender = cur.fetchone()
+    achievements = achievement_progress_sql(
+        "LEAST(a.requirement_value, ua.progress + (SELECT COUNT(*) FROM ledger))",
+        condition="EXISTS (SELECT 1 FROM ledger)"
+    )
+    cur.execute(f"""
+        WITH locked AS (
+            SELECT id FROM users WHERE id = ANY(%(involved_ids)s) ORDER BY id FOR UPDATE
+        ), recipients AS (
+            SELECT id FROM locked WHERE id = ANY(%(receiver_ids)s)
+        ), payer AS (
+            UPDATE users
+            SET coins = coins - %(price)s * (SELECT COUNT(*) FROM recipients)
+            WHERE id = %(sender_id)s
+              AND EXISTS (SELECT 1 FROM recipients)
+              AND EXISTS (SELECT 1 FROM locked WHERE id = %(sender_id)s)
+              AND coins >= %(price)s * (SELECT COUNT(*) FROM recipients)
+            RETURNING id, coins
+        ), ledger AS (
+            INSERT INTO gift_transactions (sender_id, receiver_id, gift_id, chat_id)
+            SELECT payer.id, recipients.id, %(gift_id)s, %(chat_id)s
+            FROM payer, recipients
+            RETURNING receiver_id
+        ), received AS (
+            UPDATE users
+            SET gifts_received = gifts_received + 1
+            WHERE id IN (SELECT receiver_id FROM ledger)
+        ), advanced AS (
+            {achievements}
+        )
+        SELECT EXISTS (SELECT 1 FROM locked WHERE id = %(sender_id)s) AS sender_found,
+               (SELECT COUNT(*) FROM recipients) AS recipients,
+               (SELECT coins FROM payer) AS coins,
+               (SELECT COUNT(*) FROM ledger) AS sent,
+               COALESCE((
+                   SELECT json_agg(json_build_object('id', id, 'name', name, 'icon', icon))
+                   FROM advanced WHERE unlocked
+               ), '[]') AS unlocked_achievements
+    """, {
+        'receiver_ids': receiver_ids,
+        'involved_ids': [sender_id] + receiver_ids,
+        'sender_id': sender_id,
+        'price': gift['price'],
+        'gift_id': gift['id'],
+        'chat_id': body.get('chatId'),
+        'achievement_users': [sender_id],
+        'requirement_type': 'gifts',
+    })
+    result = cur.fetchone()
     
-    if sender['coins'] < gift['price']:
-        cur.close()
-        conn.close()
+    conn.commit()
+    cur.close()
+    release_db_connection(conn)
+    
+    if not result['sent']:
+        if not result['sender_found']:
+            status, error = 404, 'Sender not found'
+        elif result['recipients'] == 0:
+            status, error = 404, 'Receiver not found'
+        else:
+            status, error = 400, 'Not enough coins'
         return {
-            'statusCode': 400,
+            'statusCode': status,
             'headers': cors_headers(),
-            'body': json.dumps({'error': 'Not enough coins'}),
+            'body': to_json({'error': error}),
             'isBase64Encoded': False
         }
     
-    chat_id = body.get('chatId')
+    return {
+        'statusCode': 201,
+        'headers': cors_headers(),
+        'body': to_json({
+            'success': True,
+            'sent': result['sent'],
+            'coins': result['coins'],
+            'unlockedAchievements': result['unlocked_achievements']
+        }),
+        'isBase64Encoded': False
+    }
+
+def load_gift_catalog(cur) -> List[Dict[str, Any]]:
+    cur.execute("SELECT id, name, icon, price FROM gifts ORDER BY price")
+    return cur.fetchall()
+
+def get_gifts(event: Dict[str, Any]) -> Dict[str, Any]:
+    catalog = cached_catalog('gifts', (), load_gift_catalog)
+    return conditional_response(event, catalog['body'], catalog['etag'], public_cache_control())
+
+LEADERBOARD_TOP_N = int(os.environ.get('LEADERBOARD_TOP_N', '50'))
+LEADERBOARD_REFRESH_LOCK = 0x6c647262
+# scope -> users expression giving the board a user belongs to.
+LEADERBOARD_SCOPES = {
+    'global': "''",
+    'country': "lower(COALESCE(u.country, ''))",
+    'language': "lower(u.learning_language)",
+}
+
+def load_leaderboard(scope: str, value: str) -> Callable[[Any], Dict[str, Any]]:
+    def loader(cur) -> Dict[str, Any]:
+        cur.execute("""
+            SELECT l.rank, l.user_id as id, u.name, u.avatar, u.country, l.xp, l.level
+            FROM leaderboard l
+            JOIN users u ON u.id = l.user_id
+            WHERE l.scope = %s AND l.scope_value = %s
+            ORDER BY l.rank, l.user_id
+            LIMIT %s
+        """, (scope, value, LEADERBOARD_TOP_N))
+        top = cur.fetchall()
+        cur.execute("SELECT updated_at FROM catalog_versions WHERE name = 'leaderboard'")
+        refreshed = cur.fetchone()
+        return {
+            'scope': scope,
+            'value': value,
+            'top': top,
+            'refreshedAt': refreshed['updated_at'] if refreshed else None,
+        }
+    return loader
+
+def load_leaderboard_boards(cur) -> List[List[str]]:
+    cur.execute("SELECT DISTINCT scope, scope_value FROM leaderboard WHERE rank = 1")
+    return [[row['scope'], row['scope_value']] for row in cur.fetchall()]
+
+def leaderboard_board(scope: str, value: str, cur=None) -> Dict[str, Any]:
+    """Cached board; values that name no board get an empty one without a cache entry."""
+    if [scope, value] not in cached_catalog('leaderboard', ('boards',), load_leaderboard_boards, cur)['data']:
+        data = {'scope': scope, 'value': value, 'top': [], 'refreshedAt': None}
+        body = to_json(data)
+        return {'data': data, 'body': body, 'etag': make_etag(body)}
+    return cached_catalog('leaderboard', (scope, value), load_leaderboard(scope, value), cur)
+
+def get_leaderboard(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Top LEADERBOARD_TOP_N by XP of the global, a country or a learning-language board,
+    served from the catalog cache until the next refresh. With userId, also returns that
+    user's rank (one unique-index lookup) and defaults value to the user's own board.
+    """
+    params = event.get('queryStringParameters', {}) or {}
+    scope = params.get('scope', 'global')
+    value = params.get('value', '').strip().lower() or None
+    user_id = params.get('userId')
+    
+    if scope not in LEADERBOARD_SCOPES:
+        return bad_request(f"scope must be one of: {', '.join(LEADERBOARD_SCOPES)}")
+    if scope == 'global':
+        value = ''
+    elif value is None and not user_id:
+        return bad_request('value or userId is required for this scope')
     
-    cur.execute("""
-        INSERT INTO gift_transactions (sender_id, receiver_id, gift_id, chat_id)
-        VALUES (%s, %s, %s, %s)
-    """, (body['senderId'], body['receiverId'], body['giftId'], chat_id))
+    if not user_id:
+        catalog = leaderboard_board(scope, value)
+        return conditional_response(event, catalog['body'], catalog['etag'], public_cache_control())
     
-    cur.execute("UPDATE users SET coins = coins - %s WHERE id = %s", (gift['price'], body['senderId']))
-    cur.execute("UPDATE users SET gifts_received = gifts_received + 1 WHERE id = %s", (body['receiverId'],))
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=TimedCursor)
+    
+    cur.execute(f"""
+        SELECT b.value, l.rank, l.xp, l.level
+        FROM users u
+        CROSS JOIN LATERAL (SELECT COALESCE(%s, {LEADERBOARD_SCOPES[scope]}) AS value) b
+        LEFT JOIN leaderboard l
+               ON l.scope = %s AND l.scope_value = b.value AND l.user_id = u.id
+        WHERE u.id = %s
+    """, (value, scope, user_id))
+    me = cur.fetchone()
+    
+    if me is None:
+        cur.close()
+        release_db_connection(conn)
+        return {
+            'statusCode': 404,
+            'headers': cors_headers(),
+            'body': to_json({'error': 'User not found'}),
+            'isBase64Encoded': False
+        }
     
-    conn.commit()
+    value = me.pop('value')
+    catalog = leaderboard_board(scope, value, cur)
     cur.close()
-    conn.close()
+    release_db_connection(conn)
     
     return {
-        'statusCode': 201,
-        'headers': cors_headers(),
-        'body': json.dumps({'success': True}),
+        'statusCode': 200,
+        'headers': dict(cors_headers(), **{'Cache-Control': 'private, no-cache'}),
+        'body': to_json(dict(catalog['data'], me=me if me['rank'] is not None else None)),
         'isBase64Encoded': False
     }
 
-def get_gifts(event: Dict[str, Any]) -> Dict[str, Any]:
+def refresh_leaderboards(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Timer entry point: recomputes every board with REFRESH MATERIALIZED VIEW CONCURRENTLY,
+    so reads never block, then bumps the 'leaderboard' catalog version to drop cached top-N.
+    """
     conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = conn.cursor(cursor_factory=TimedCursor)
     
-    cur.execute("SELECT id, name, icon, price FROM gifts ORDER BY price")
-    gifts = cur.fetchall()
+    cur.execute("SELECT pg_try_advisory_xact_lock(%s) AS locked", (LEADERBOARD_REFRESH_LOCK,))
+    if not cur.fetchone()['locked']:
+        conn.rollback()
+        cur.close()
+        release_db_connection(conn)
+        return {
+            'statusCode': 409,
+            'headers': cors_headers(),
+            'body': to_json({'error': 'Refresh already running'}),
+            'isBase64Encoded': False
+        }
     
+    started = time.perf_counter()
+    cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY leaderboard")
+    cur.execute("""
+        UPDATE catalog_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE name = 'leaderboard'
+        RETURNING updated_at
+    """)
+    refreshed = cur.fetchone()
+    conn.commit()
     cur.close()
-    conn.close()
+    release_db_connection(conn)
     
     return {
         'statusCode': 200,
         'headers': cors_headers(),
-        'body': json.dumps([dict(g) for g in gifts]),
+        'body': to_json({
+            'refreshedAt': refreshed['updated_at'] if refreshed else None,
+            'ms': round((time.perf_counter() - started) * 1000, 1)
+        }),
         'isBase64Encoded': False
-    }
\ No newline at end of file
+    }
+
+ROUTES: Dict[Tuple[str, str], Dict[str, Any]] = {
+    ('register', 'POST'): route(register_user, body=('email', 'name', 'nativeLanguage', 'learningLanguage', 'country'),
+                                  limit=(0.1, 5), priority=PRIORITY_HIGH),
+    ('login', 'POST'): route(login_user, body=('email',), limit=(0.5, 10), priority=PRIORITY_HIGH),
+    # Listings and exports are shed first under DB load; sign-in, messaging and heartbeats last.
+    # users, matches and presence read the unlogged presence table, which exists only on the primary.
+    ('users', 'GET'): route(get_users, priority=PRIORITY_LOW),
+    ('matches', 'GET'): route(get_matches, query=('userId',), priority=PRIORITY_LOW),
+    ('heartbeat', 'POST'): route(heartbeat, body=('userId',), priority=PRIORITY_HIGH),
+    ('presence', 'GET'): route(get_presence, query=('ids',), priority=PRIORITY_LOW),
+    ('user', 'GET'): route(get_user_profile, query=('id',), read_only=True),
+    ('update_user', 'PUT'): route(update_user, query=('id',)),
+    ('chats', 'GET'): route(get_user_chats, query=('userId',), read_only=True),
+    ('chats', 'POST'): route(create_chat, body=('user1Id', 'user2Id')),
+    ('messages', 'GET'): route(get_chat_messages, query=('chatId',), read_only=True),
+    ('messages', 'POST'): route(send_message, body=('chatId', 'senderId', 'message'), limit=(2, 20),
+                                   priority=PRIORITY_HIGH),
+    ('sync', 'GET'): route(sync_updates, query=('userId',), batch=False),
+    ('export_chat', 'GET'): route(export_chat, query=('chatId',), batch=False, read_only=True,
+                                      limit=(1, 10), priority=PRIORITY_LOW),
+    ('add_friend', 'POST'): route(add_friend, body=('userId', 'friendId')),
+    ('complete_lesson', 'POST'): route(complete_lesson, body=('userId', 'lessonId')),
+    ('send_gift', 'POST'): route(send_gift, body=('senderId', 'giftId'), limit=(1, 10)),
+    # Catalog actions set their own ETag-based Cache-Control.
+    ('achievements', 'GET'): route(get_user_achievements, cache=None, read_only=True),
+    ('lessons', 'GET'): route(get_lessons, cache=None, read_only=True),
+    ('gifts', 'GET'): route(get_gifts, cache=None, read_only=True),
+    ('leaderboard', 'GET'): route(get_leaderboard, cache=None, read_only=True, priority=PRIORITY_LOW),
+    # Timer-triggered workers, POST with X-Timer-Token.
+    ('translation_worker', 'POST'): route(process_translation_jobs, timer=True),
+    ('fold_counters', 'POST'): route(fold_message_counters, timer=True),
+    ('refresh_leaderboards', 'POST'): route(refresh_leaderboards, timer=True, priority=PRIORITY_LOW),
+    # A batch reads from a replica when all of its requests are read_only GETs.
+    ('batch', 'POST'): route(run_batch, batch=False, read_only=True, limit=(2, 10)),
+    ('stats', 'GET'): route(get_stats, priority=PRIORITY_HIGH, timer=True),
+}
+
+MODULE_IMPORTS = set(IMPORT_TIMES)
+MODULE_IMPORT_MS = round((time.perf_counter() - _MODULE_STARTED) * 1000, 3)
@@ -7,45 +7,622 @@ Returns: HTTP response dict with translated text
 
 import json
 import os
-from typing import Dict, Any
-import urllib.request
+import re
+import hashlib
+import hmac
+import http.client
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
 import urllib.parse
 
+try:
+    import psycopg2
+    import psycopg2.extras
+except ImportError:
+    psycopg2 = None
+
+CACHE_MAX_ENTRIES = int(os.environ.get('TRANSLATION_CACHE_SIZE', '5000'))
+CACHE_TTL = float(os.environ.get('TRANSLATION_CACHE_TTL', '86400'))
+CACHE_DB_ENABLED = os.environ.get('TRANSLATION_CACHE_DB', '') in ('1', 'true', 'yes')
+CACHE_DB_TTL_DAYS = int(os.environ.get('TRANSLATION_CACHE_DB_TTL_DAYS', '30'))
+
+GOOGLE_TRANSLATE_URL = os.environ.get(
+    'GOOGLE_TRANSLATE_URL', 'https://translation.googleapis.com/language/translate/v2'
+)
+
+DEFAULT_DEADLINE_MS = int(os.environ.get('TRANSLATE_DEFAULT_DEADLINE_MS', '3000'))
+MAX_DEADLINE_MS = int(os.environ.get('TRANSLATE_MAX_DEADLINE_MS', '10000'))
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('TRANSLATE_BREAKER_FAILURES', '5'))
+BREAKER_RESET_TIMEOUT = float(os.environ.get('TRANSLATE_BREAKER_RESET_SECONDS', '30'))
+# A provider timeout counts as a breaker failure only when the call had at least this long;
+# shorter ones were cut by the caller's deadlineMs and say nothing about the provider.
+BREAKER_MIN_TIMEOUT_MS = int(os.environ.get('TRANSLATE_BREAKER_MIN_TIMEOUT_MS', '1000'))
+
+BATCH_MAX_ITEMS = int(os.environ.get('TRANSLATE_BATCH_MAX_ITEMS', '200'))
+# Google Translation v2 accepts at most 128 q segments per request and
+# recommends keeping a request under 5000 characters.
+PROVIDER_MAX_SEGMENTS = 128
+PROVIDER_MAX_CHARS = int(os.environ.get('TRANSLATE_PROVIDER_MAX_CHARS', '5000'))
+
+# Texts per second per client (X-User-Id, else source IP); a batch costs one token per text.
+RATE_LIMIT_RPS = float(os.environ.get('TRANSLATE_RATE_LIMIT_RPS', '5'))
+RATE_LIMIT_BURST = float(os.environ.get('TRANSLATE_RATE_LIMIT_BURST', '50'))
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('TRANSLATE_RATE_LIMIT_MAX_KEYS', '10000'))
+# The api's translation worker sends this as X-Internal-Token and is not rate-limited; action=stats
+# answers only requests carrying it.
+INTERNAL_TOKEN = os.environ.get('TRANSLATE_INTERNAL_TOKEN', '')
+
+CacheKey = Tuple[str, str, str]
+
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_text(text: str) -> str:
+    return _WHITESPACE.sub(' ', text).strip()
+
+def cache_key(text: str, target_lang: str, source_lang: str) -> CacheKey:
+    return (normalize_text(text), source_lang.lower(), target_lang.lower())
+
+class LRUCache:
+    """Bounded in-process cache; entries expire ttl seconds after insertion."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: 'OrderedDict[CacheKey, Tuple[str, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: CacheKey) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key: CacheKey, value: str) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+memory_cache = LRUCache(CACHE_MAX_ENTRIES, CACHE_TTL)
+
+SINGLE_FLIGHT_WAIT = float(os.environ.get('TRANSLATE_SINGLE_FLIGHT_WAIT', '10'))
+
+SINGLE_FLIGHT_STATS: Dict[str, int] = {'leaders': 0, 'followers': 0, 'timeouts': 0}
+
+class InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Optional[str] = None
+
+class SingleFlight:
+    """
+    Deduplicates concurrent upstream translations of the same cache key. The first caller
+    (leader) does the upstream call; later callers wait up to wait_timeout seconds for its
+    result and, if it does not arrive in time, fall back to their own upstream call.
+    """
+
+    def __init__(self, wait_timeout: float):
+        self.wait_timeout = wait_timeout
+        self._calls: Dict[CacheKey, InFlight] = {}
+        self._lock = threading.Lock()
+
+    def begin(self, key: CacheKey) -> Tuple[InFlight, bool]:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                SINGLE_FLIGHT_STATS['followers'] += 1
+                return call, False
+            call = self._calls[key] = InFlight()
+            SINGLE_FLIGHT_STATS['leaders'] += 1
+            return call, True
+
+    def finish(self, key: CacheKey, call: InFlight, value: Optional[str]) -> None:
+        call.value = value
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.done.set()
+
+    def wait(self, call: InFlight, timeout: Optional[float] = None) -> Tuple[bool, Optional[str]]:
+        timeout = self.wait_timeout if timeout is None else max(0.0, min(timeout, self.wait_timeout))
+        if not call.done.wait(timeout):
+            with self._lock:
+                SINGLE_FLIGHT_STATS['timeouts'] += 1
+            return False, None
+        return True, call.value
+
+single_flight = SingleFlight(SINGLE_FLIGHT_WAIT)
+
+_db_conn = None
+
+def _db_cache_available() -> bool:
+    return CACHE_DB_ENABLED and psycopg2 is not None and bool(os.environ.get('DATABASE_URL'))
+
+def _get_db_conn():
+    global _db_conn
+    if _db_conn is None or _db_conn.closed:
+        _db_conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        _db_conn.autocommit = True
+    return _db_conn
+
+def _text_hash(normalized: str) -> str:
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+def db_cache_get_many(keys: List[CacheKey]) -> Dict[CacheKey, str]:
+    global _db_conn
+    if not keys or not _db_cache_available():
+        return {}
+    by_hash = {(_text_hash(text), source_lang, target_lang): (text, source_lang, target_lang)
+               for text, source_lang, target_lang in keys}
+    try:
+        with _get_db_conn().cursor() as cur:
+            cur.execute("""
+                SELECT text_hash, source_lang, target_lang, translated FROM translation_cache
+                WHERE text_hash = ANY(%s)
+                  AND created_at > CURRENT_TIMESTAMP - make_interval(days => %s)
+            """, (list({h for h, _, _ in by_hash}), CACHE_DB_TTL_DAYS))
+            found = {}
+            for text_hash, source_lang, target_lang, translated in cur.fetchall():
+                key = by_hash.get((text_hash.strip(), source_lang, target_lang))
+                if key is not None:
+                    found[key] = translated
+            return found
+    except Exception:
+        _db_conn = None
+        return {}
+
+def db_cache_put_many(entries: Dict[CacheKey, str]) -> None:
+    global _db_conn
+    if not entries or not _db_cache_available():
+        return
+    rows = [(_text_hash(text), source_lang, target_lang, translated)
+            for (text, source_lang, target_lang), translated in entries.items()]
+    try:
+        with _get_db_conn().cursor() as cur:
+            psycopg2.extras.execute_values(cur, """
+                INSERT INTO translation_cache (text_hash, source_lang, target_lang, translated)
+                VALUES %s
+                ON CONFLICT (text_hash, source_lang, target_lang)
+                DO UPDATE SET translated = EXCLUDED.translated, created_at = CURRENT_TIMESTAMP
+            """, rows)
+    except Exception:
+        _db_conn = None
+
+def db_cache_get(key: CacheKey) -> Optional[str]:
+    return db_cache_get_many([key]).get(key)
+
+def db_cache_put(key: CacheKey, translated: str) -> None:
+    db_cache_put_many({key: translated})
+
 def cors_headers():
     return {
         'Content-Type': 'application/json',
         'Access-Control-Allow-Origin': '*',
         'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
         'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+        'Access-Control-Expose-Headers': 'Retry-After',
         'Access-Control-Max-Age': '86400'
     }
 
-def translate_with_google(text: str, target_lang: str, source_lang: str = 'auto') -> str:
+def make_deadline(deadline_ms: Optional[Any] = None) -> float:
+    """Monotonic deadline for a request's upstream budget, capped at MAX_DEADLINE_MS."""
+    budget_ms = DEFAULT_DEADLINE_MS if deadline_ms in (None, '') else int(deadline_ms)
+    return time.monotonic() + max(0, min(budget_ms, MAX_DEADLINE_MS)) / 1000
+
+def remaining(deadline: float) -> float:
+    return deadline - time.monotonic()
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive upstream failures and rejects calls for
+    reset_timeout seconds; then lets a single probe through (half-open) to decide whether
+    to close again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.stats = {'opened': 0, 'rejected': 0, 'successes': 0, 'failures': 0}
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self._probe_in_flight = False
+            if self.state == 'closed':
+                return True
+            if self.state == 'half_open' and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.stats['rejected'] += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.stats['successes'] += 1
+            self.state = 'closed'
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_inconclusive(self) -> None:
+        """The call said nothing about the provider (e.g. the caller's own budget ran out)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.stats['failures'] += 1
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.stats['opened'] += 1
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, state=self.state, consecutiveFailures=self.failures)
+
+breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT)
+
+class RateLimiter:
+    """
+    Per-client token buckets holding up to burst tokens and refilling at rate per second.
+    Only the max_keys most recently seen clients are tracked.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.limited = 0
+        self._buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client: str, cost: float = 1) -> float:
+        """Returns 0 when cost tokens were taken, otherwise the seconds until they are available."""
+        cost = min(cost, self.burst)
+        now = time.monotonic()
+        with self._lock:
+            tokens, refilled = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - refilled) * self.rate)
+            wait = 0.0 if tokens >= cost else (cost - tokens) / self.rate
+            self._buckets[client] = (tokens - cost if wait == 0 else tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            if wait:
+                self.limited += 1
+        return wait
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'limited': self.limited, 'trackedClients': len(self._buckets)}
+
+limiter = RateLimiter(RATE_LIMIT_RPS, RATE_LIMIT_BURST, RATE_LIMIT_MAX_KEYS)
+
+def internal_caller(event: Dict[str, Any]) -> bool:
+    """True when X-Internal-Token matches INTERNAL_TOKEN; always False while it is unset."""
+    headers = {name.lower(): value for name, value in (event.get('headers') or {}).items()}
+    return bool(INTERNAL_TOKEN) and hmac.compare_digest(headers.get('x-internal-token') or '', INTERNAL_TOKEN)
+
+def client_identity(event: Dict[str, Any]) -> Optional[str]:
+    """X-User-Id, else the source IP; None for the internal worker and timer calls."""
+    if internal_caller(event):
+        return None
+    headers = {name.lower(): value for name, value in (event.get('headers') or {}).items()}
+    if headers.get('x-user-id'):
+        return 'u:' + headers['x-user-id'][:64]
+    source_ip = ((event.get('requestContext') or {}).get('identity') or {}).get('sourceIp')
+    return 'ip:' + source_ip if source_ip else None
+
+# One keep-alive connection per thread; http.client connections are not thread-safe.
+_http = threading.local()
+
+def _provider_connection(timeout: float):
+    parsed = urllib.parse.urlsplit(GOOGLE_TRANSLATE_URL)
+    conn = getattr(_http, 'conn', None)
+    if conn is None:
+        conn_class = http.client.HTTPSConnection if parsed.scheme == 'https' else http.client.HTTPConnection
+        conn = _http.conn = conn_class(parsed.netloc, timeout=timeout)
+    conn.timeout = timeout
+    if conn.sock is not None:
+        conn.sock.settimeout(timeout)
+    return conn, parsed.path or '/'
+
+def _drop_provider_connection() -> None:
+    conn = getattr(_http, 'conn', None)
+    _http.conn = None
+    if conn is not None:
+        conn.close()
+
+def post_to_provider(data: bytes, deadline: float) -> Tuple[int, bytes]:
+    """POSTs form data over the thread's keep-alive connection, reconnecting once if it went stale."""
+    for attempt in range(2):
+        timeout = remaining(deadline)
+        if timeout <= 0:
+            raise TimeoutError('Translation deadline exceeded')
+        conn, path = _provider_connection(timeout)
+        try:
+            conn.request('POST', path, body=data, headers={
+                'Content-Type': 'application/x-www-form-urlencoded',
+                'Connection': 'keep-alive'
+            })
+            response = conn.getresponse()
+            payload = response.read()
+            if response.will_close:
+                _drop_provider_connection()
+            return response.status, payload
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            _drop_provider_connection()
+            if attempt:
+                raise
+        except Exception:
+            _drop_provider_connection()
+            raise
+    raise RuntimeError('unreachable')
+
+def call_google_batch(texts: List[str], target_lang: str, source_lang: str = 'auto',
+                      deadline: Optional[float] = None) -> Optional[List[str]]:
+    """
+    Translates up to PROVIDER_MAX_SEGMENTS texts with one request using repeated q params.
+    Returns None when the caller must fall back: no API key, open breaker, exhausted deadline
+    or upstream error.
+    """
     api_key = os.environ.get('GOOGLE_TRANSLATE_API_KEY')
     
     if not api_key:
-        return text
+        return None
     
-    url = 'https://translation.googleapis.com/language/translate/v2'
+    if deadline is None:
+        deadline = make_deadline()
     
-    params = {
-        'key': api_key,
-        'q': text,
-        'target': target_lang
-    }
+    if remaining(deadline) <= 0 or not breaker.allow():
+        return None
+    
+    params = [('key', api_key), ('target', target_lang)]
     
     if source_lang != 'auto':
-        params['source'] = source_lang
+        params.append(('source', source_lang))
+    
+    params.extend(('q', text) for text in texts)
     
     data = urllib.parse.urlencode(params).encode('utf-8')
+    budget = remaining(deadline)
     
     try:
-        req = urllib.request.Request(url, data=data, method='POST')
-        with urllib.request.urlopen(req, timeout=10) as response:
-            result = json.loads(response.read().decode('utf-8'))
-            return result['data']['translations'][0]['translatedText']
+        status, payload = post_to_provider(data, deadline)
+    except TimeoutError:
+        # A caller's short deadlineMs must not open the shared breaker for every other client.
+        if budget * 1000 >= BREAKER_MIN_TIMEOUT_MS:
+            breaker.record_failure()
+        else:
+            breaker.record_inconclusive()
+        return None
     except Exception:
-        return text
+        breaker.record_failure()
+        return None
+    
+    if status == 429 or status >= 500:
+        breaker.record_failure()
+        return None
+    
+    # Other 4xx are problems with this request (e.g. unsupported language), not with the provider.
+    breaker.record_success()
+    if status != 200:
+        return None
+    
+    try:
+        result = json.loads(payload.decode('utf-8'))
+        translations = [t['translatedText'] for t in result['data']['translations']]
+    except (ValueError, KeyError, TypeError):
+        return None
+    return translations if len(translations) == len(texts) else None
+
+def call_google(text: str, target_lang: str, source_lang: str = 'auto',
+                deadline: Optional[float] = None) -> Optional[str]:
+    translations = call_google_batch([text], target_lang, source_lang, deadline)
+    return translations[0] if translations else None
+
+def provider_chunks(texts: List[str]) -> List[List[str]]:
+    chunks: List[List[str]] = []
+    current: List[str] = []
+    chars = 0
+    for text in texts:
+        if current and (len(current) >= PROVIDER_MAX_SEGMENTS or chars + len(text) > PROVIDER_MAX_CHARS):
+            chunks.append(current)
+            current, chars = [], 0
+        current.append(text)
+        chars += len(text)
+    if current:
+        chunks.append(current)
+    return chunks
+
+TranslationResult = Tuple[str, Optional[str], bool]
+
+def translate_cached(text: str, target_lang: str, source_lang: str = 'auto',
+                     deadline: Optional[float] = None) -> TranslationResult:
+    """
+    Returns (translated text, cache tier that served it: 'memory', 'db' or None, fallback).
+    fallback is True when the original text is echoed back because translation failed.
+    """
+    if deadline is None:
+        deadline = make_deadline()
+    key = cache_key(text, target_lang, source_lang)
+    
+    translated = memory_cache.get(key)
+    if translated is not None:
+        return translated, 'memory', False
+    
+    translated = db_cache_get(key)
+    if translated is not None:
+        memory_cache.put(key, translated)
+        return translated, 'db', False
+    
+    call, leader = single_flight.begin(key)
+    if not leader:
+        completed, translated = single_flight.wait(call, remaining(deadline))
+        if completed:
+            return (text, None, True) if translated is None else (translated, None, False)
+    
+    translated = None
+    try:
+        # The previous leader may have filled the cache between our lookup and begin().
+        translated = memory_cache.get(key) if leader else None
+        if translated is None:
+            translated = call_google(key[0], target_lang, source_lang, deadline)
+            if translated is not None:
+                memory_cache.put(key, translated)
+                db_cache_put(key, translated)
+    finally:
+        if leader:
+            single_flight.finish(key, call, translated)
+    
+    if translated is None:
+        return text, None, True
+    return translated, None, False
+
+def translate_with_google(text: str, target_lang: str, source_lang: str = 'auto') -> str:
+    return translate_cached(text, target_lang, source_lang)[0]
+
+def translate_batch(items: List[Tuple[str, str, str]], deadline: Optional[float] = None) -> List[TranslationResult]:
+    """
+    Translates (text, target_lang, source_lang) items, returning (translated, cache tier, fallback)
+    in input order. Cache misses are grouped by language pair and deduplicated, so each
+    group costs one upstream request per provider_chunks chunk.
+    """
+    if deadline is None:
+        deadline = make_deadline()
+    results: List[Optional[TranslationResult]] = [None] * len(items)
+    keys = [cache_key(text, target_lang, source_lang) for text, target_lang, source_lang in items]
+    
+    misses: Dict[CacheKey, List[int]] = {}
+    for i, key in enumerate(keys):
+        translated = memory_cache.get(key)
+        if translated is not None:
+            results[i] = (translated, 'memory', False)
+        else:
+            misses.setdefault(key, []).append(i)
+    
+    for key, translated in db_cache_get_many(list(misses)).items():
+        memory_cache.put(key, translated)
+        for i in misses.pop(key):
+            results[i] = (translated, 'db', False)
+    
+    # Keys another request is already translating are awaited instead of sent again.
+    owned: Dict[CacheKey, InFlight] = {}
+    awaited: Dict[CacheKey, InFlight] = {}
+    for key in misses:
+        call, leader = single_flight.begin(key)
+        (owned if leader else awaited)[key] = call
+    
+    fresh: Dict[CacheKey, str] = {}
+    try:
+        groups: Dict[Tuple[str, str], List[str]] = {}
+        for text, source_lang, target_lang in owned:
+            groups.setdefault((target_lang, source_lang), []).append(text)
+        
+        for (target_lang, source_lang), texts in groups.items():
+            for chunk in provider_chunks(texts):
+                translations = call_google_batch(chunk, target_lang, source_lang, deadline)
+                if translations is None:
+                    continue
+                for text, translated in zip(chunk, translations):
+                    fresh[(text, source_lang, target_lang)] = translated
+        
+        for key, translated in fresh.items():
+            memory_cache.put(key, translated)
+        db_cache_put_many(fresh)
+    finally:
+        for key, call in owned.items():
+            single_flight.finish(key, call, fresh.get(key))
+    
+    for key, call in awaited.items():
+        completed, translated = single_flight.wait(call, remaining(deadline))
+        if not completed:
+            translated = call_google(key[0], key[2], key[1], deadline)
+            if translated is not None:
+                memory_cache.put(key, translated)
+                db_cache_put(key, translated)
+        if translated is not None:
+            fresh[key] = translated
+    
+    for key, indexes in misses.items():
+        for i in indexes:
+            results[i] = (fresh[key], None, False) if key in fresh else (items[i][0], None, True)
+    
+    return results
+
+def handle_batch(body: Dict[str, Any]) -> Dict[str, Any]:
+    texts = body.get('texts')
+    default_target = body.get('targetLang', 'en')
+    default_source = body.get('sourceLang', 'auto')
+    
+    if not isinstance(texts, list) or not texts:
+        return {
+            'statusCode': 400,
+            'headers': cors_headers(),
+            'body': json.dumps({'error': 'texts must be a non-empty array'}),
+            'isBase64Encoded': False
+        }
+    
+    if len(texts) > BATCH_MAX_ITEMS:
+        return {
+            'statusCode': 400,
+            'headers': cors_headers(),
+            'body': json.dumps({'error': f'At most {BATCH_MAX_ITEMS} texts per batch'}),
+            'isBase64Encoded': False
+        }
+    
+    items = []
+    for entry in texts:
+        if isinstance(entry, dict):
+            items.append((
+                entry.get('text') or '',
+                entry.get('targetLang', default_target),
+                entry.get('sourceLang', default_source)
+            ))
+        else:
+            items.append((str(entry or ''), default_target, default_source))
+    
+    translated = translate_batch([item for item in items if item[0]], make_deadline(body.get('deadlineMs')))
+    
+    translations = []
+    pending = iter(translated)
+    for text, target_lang, source_lang in items:
+        translated_text, cache_tier, fallback = next(pending) if text else (text, None, False)
+        translations.append({
+            'original': text,
+            'translated': translated_text,
+            'sourceLang': source_lang,
+            'targetLang': target_lang,
+            'cached': cache_tier is not None,
+            'cacheTier': cache_tier,
+            'fallback': fallback
+        })
+    
+    return {
+        'statusCode': 200,
+        'headers': cors_headers(),
+        'body': json.dumps({'translations': translations}),
+        'isBase64Encoded': False
+    }
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
@@ -58,6 +635,28 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
+    if method == 'GET' and (event.get('queryStringParameters') or {}).get('action') == 'stats':
+        if not internal_caller(event):
+            return {
+                'statusCode': 403,
+                'headers': cors_headers(),
+                'body': json.dumps({'error': 'Forbidden'}),
+                'isBase64Encoded': False
+            }
+        return {
+            'statusCode': 200,
+            'headers': cors_headers(),
+            'body': json.dumps({
+                'singleFlight': dict(
+                    SINGLE_FLIGHT_STATS,
+                    upstreamCallsSaved=SINGLE_FLIGHT_STATS['followers'] - SINGLE_FLIGHT_STATS['timeouts']
+                ),
+                'breaker': breaker.snapshot(),
+                'rateLimit': limiter.snapshot()
+            }),
+            'isBase64Encoded': False
+        }
+    
     if method != 'POST':
         return {
             'statusCode': 405,
@@ -68,6 +667,23 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     try:
         body = json.loads(event.get('body', '{}'))
+        
+        client = client_identity(event)
+        if client is not None:
+            texts = body.get('texts')
+            wait = limiter.take(client, len(texts) if isinstance(texts, list) and texts else 1)
+            if wait:
+                retry_after = max(1, int(wait + 0.999))
+                return {
+                    'statusCode': 429,
+                    'headers': dict(cors_headers(), **{'Retry-After': str(retry_after)}),
+                    'body': json.dumps({'error': 'Too many requests', 'retryAfter': retry_after}),
+                    'isBase64Encoded': False
+                }
+        
+        if 'texts' in body:
+            return handle_batch(body)
+        
         text = body.get('text', '')
         target_lang = body.get('targetLang', 'en')
         source_lang = body.get('sourceLang', 'auto')
@@ -80,7 +696,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'isBase64Encoded': False
             }
         
-        translated_text = translate_with_google(text, target_lang, source_lang)
+        translated_text, cache_tier, fallback = translate_cached(
+            text, target_lang, source_lang, make_deadline(body.get('deadlineMs'))
+        )
         
         return {
             'statusCode': 200,
@@ -89,7 +707,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'original': text,
                 'translated': translated_text,
                 'sourceLang': source_lang,
-                'targetLang': target_lang
+                'targetLang': target_lang,
+                'cached': cache_tier is not None,
+                'cacheTier': cache_tier,
+                'fallback': fallback
             }),
             'isBase64Encoded': False
         }
@@ -0,0 +1,63 @@
+"""
+Business: Cold-start check for the api handler, one fresh interpreter per run
+Args: --runs, --budget-ms (defaults to STARTUP_BUDGET_MS or 150), --with-db to also time the
+      lazy psycopg2 import that the first database request pays
+Returns: JSON report with median import timings per module; exit code 1 when over budget
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+API_PATH = os.path.join(ROOT_DIR, 'backend', 'api', 'index.py')
+
+PROBE = '''
+import importlib.util, json, sys, time
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location('api', sys.argv[1])
+api = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(api)
+api.handler({'httpMethod': 'OPTIONS', 'queryStringParameters': {'action': 'users'}}, None)
+preflight_ms = (time.perf_counter() - started) * 1000
+if sys.argv[2] == '1':
+    api.load_db_driver()
+print(json.dumps(dict(api.startup_report(), preflight_ms=round(preflight_ms, 3))))
+'''
+
+def probe(with_db: bool) -> Dict[str, Any]:
+    env = dict(os.environ, METRICS_LOG='false')
+    output = subprocess.check_output([sys.executable, '-c', PROBE, API_PATH, '1' if with_db else '0'], env=env, text=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('STARTUP_BUDGET_MS', '150')))
+    parser.add_argument('--with-db', action='store_true')
+    args = parser.parse_args(argv)
+
+    samples = [probe(args.with_db) for _ in range(args.runs)]
+    modules = sorted({name for s in samples for name in s['imports_ms']})
+    report = {
+        'runs': args.runs,
+        'budget_ms': args.budget_ms,
+        'module_ms': round(statistics.median(s['module_ms'] for s in samples), 3),
+        'preflight_ms': round(statistics.median(s['preflight_ms'] for s in samples), 3),
+        'total_ms': round(statistics.median(s['total_ms'] for s in samples), 3),
+        'imports_ms': {
+            name: round(statistics.median(s['imports_ms'].get(name, 0.0) for s in samples), 3) for name in modules
+        },
+    }
+    report['over_budget'] = report['total_ms'] > args.budget_ms
+
+    print(json.dumps(report, indent=2))
+    return 1 if report['over_budget'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,111 @@
+"""
+Business: Leaderboard benchmark at scale (1M users by default) against a local Postgres
+Args: --dsn, --users, --seed to recreate the dataset, --samples of "my rank" lookups
+Returns: JSON report with refresh time, "my rank" and top-N latency per scope, and the
+         COUNT(*)-based rank query it replaces for comparison
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+import psycopg2
+import psycopg2.extensions
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import seed
+from run import get_event, instrument_queries, load_handler, percentile, post_event
+
+SCOPES = ('global', 'country', 'language')
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        'p50_ms': round(percentile(ordered, 50), 3),
+        'p95_ms': round(percentile(ordered, 95), 3),
+        'p99_ms': round(percentile(ordered, 99), 3),
+        'max_ms': round(ordered[-1], 3),
+    }
+
+def timed_call(api, event: Dict[str, Any]) -> float:
+    started = time.perf_counter()
+    response = api.handler(event, None)
+    elapsed = (time.perf_counter() - started) * 1000
+    if response['statusCode'] != 200:
+        raise RuntimeError(f"{event['queryStringParameters']} -> {response['statusCode']}: {response['body']}")
+    return elapsed
+
+def naive_rank_ms(dsn: str, user_ids: List[int]) -> Dict[str, float]:
+    """What a rank costs without the view: count users with more XP."""
+    conn = psycopg2.connect(dsn)
+    samples = []
+    with conn.cursor() as cur:
+        cur.execute(f"SET search_path TO {seed.SCHEMA}, public")
+        for user_id in user_ids:
+            started = time.perf_counter()
+            cur.execute("SELECT COUNT(*) + 1 FROM users WHERE xp > (SELECT xp FROM users WHERE id = %s)", (user_id,))
+            cur.fetchone()
+            samples.append((time.perf_counter() - started) * 1000)
+    conn.close()
+    return latency_summary(samples)
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL'), required=not os.environ.get('BENCH_DATABASE_URL'))
+    parser.add_argument('--seed', action='store_true', help='recreate the schema with --users users before running')
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--samples', type=int, default=500)
+    parser.add_argument('--random-seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    if args.seed:
+        conn = psycopg2.connect(args.dsn)
+        seed.apply_migrations(conn)
+        seed.seed_dataset(conn, args.users, 0, 0, 0.42)
+        conn.close()
+
+    os.environ.update({
+        'DATABASE_URL': psycopg2.extensions.make_dsn(args.dsn, options=f'-c search_path={seed.SCHEMA},public'),
+        'METRICS_LOG': 'false',
+    })
+    os.environ.setdefault('TIMER_TOKEN', 'bench')
+    api = load_handler('bench_api', os.path.join(ROOT_DIR, 'backend', 'api', 'index.py'))
+    captured = instrument_queries(api)
+    rng = random.Random(args.random_seed)
+    user_ids = [rng.randint(1, args.users) for _ in range(args.samples)]
+
+    report: Dict[str, Any] = {'users': args.users, 'samples': args.samples, 'scopes': {}}
+    refresh = dict(post_event('refresh_leaderboards', {}), headers={'X-Timer-Token': os.environ['TIMER_TOKEN']})
+    report['refresh_ms'] = round(timed_call(api, refresh), 1)
+
+    for scope in SCOPES:
+        my_rank = []
+        queries = 0
+        for user_id in user_ids:
+            captured.queries = 0
+            my_rank.append(timed_call(api, get_event('leaderboard', {'scope': scope, 'userId': user_id})))
+            queries += captured.queries
+        value = {'global': '', 'country': seed.COUNTRIES[0], 'language': seed.LANGUAGES[0]}[scope]
+        params = {'scope': scope, 'value': value} if value else {'scope': scope}
+        api._catalog_cache.clear()
+        cold = timed_call(api, get_event('leaderboard', params))
+        warm = [timed_call(api, get_event('leaderboard', params)) for _ in range(args.samples)]
+        report['scopes'][scope] = {
+            'my_rank': dict(latency_summary(my_rank), queries_per_request=round(queries / len(user_ids), 2)),
+            'top_cold_ms': round(cold, 3),
+            'top_cached': latency_summary(warm),
+        }
+
+    report['naive_global_rank'] = naive_rank_ms(args.dsn, user_ids[:min(50, len(user_ids))])
+    print(json.dumps(report, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,310 @@
+"""
+Business: Load-replay benchmark calling the api and translate handlers directly
+Args: --dsn of a local Postgres (seeded by benchmarks/seed.py or with --seed), weighted --mix,
+      --concurrency, --duration; translation goes to a local stub of the provider
+Returns: JSON report with per-action throughput, p50/p95/p99 latency and queries per request
+"""
+
+import argparse
+import importlib.util
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg2.extensions
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import seed
+from translate_stub import TranslateStubHandler, start_stub, stub_url
+
+# encode_cursor(0, 0, ''): sync from the first transaction, seeded rows included
+SYNC_FROM_START = 'MHwwfA'
+DEFAULT_MIX = 'chats=25,messages=35,users=15,send_message=10,sync=5,gifts=3,lessons=3,translate=3,translate_batch=1'
+
+PHRASES = [
+    'Hello', 'Good morning', 'How are you?', 'Thank you', 'See you tomorrow', 'Nice to meet you',
+    'What is your name?', 'Where are you from?', 'I am learning English', 'Good night',
+    'Can you help me?', 'I like this song', 'Have a nice day', 'Happy birthday', 'Welcome!',
+]
+
+Event = Dict[str, Any]
+
+def load_handler(name: str, path: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def parse_mix(mix: str) -> List[Tuple[str, float]]:
+    weights = []
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        weights.append((name.strip(), float(weight or 1)))
+    return weights
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+def get_event(action: str, params: Dict[str, Any]) -> Event:
+    return {
+        'httpMethod': 'GET',
+        'queryStringParameters': dict({'action': action}, **{k: str(v) for k, v in params.items()}),
+        'headers': {},
+    }
+
+def post_event(action: str, body: Dict[str, Any]) -> Event:
+    return {
+        'httpMethod': 'POST',
+        'queryStringParameters': {'action': action},
+        'headers': {},
+        'body': json.dumps(body),
+    }
+
+class Workload:
+    """Builds handler events for each mix entry against the id ranges produced by seed.py."""
+
+    def __init__(self, users: int, chats: int):
+        self.users = users
+        self.chats = chats
+
+    def chat_user1(self, chat_id: int) -> int:
+        return 1 + ((chat_id - 1) % self.users)
+
+    def build(self, name: str, rng: random.Random) -> Tuple[str, Event]:
+        user_id = rng.randint(1, self.users)
+        chat_id = rng.randint(1, self.chats)
+        if name == 'chats':
+            return 'api', get_event('chats', {'userId': user_id})
+        if name == 'messages':
+            return 'api', get_event('messages', {'chatId': chat_id, 'limit': 50})
+        if name == 'users':
+            params: Dict[str, Any] = {'limit': 20}
+            if rng.random() < 0.5:
+                params['search'] = rng.choice(seed.LANGUAGES)[:rng.randint(2, 6)]
+            return 'api', get_event('users', params)
+        if name == 'matches':
+            params = {'userId': user_id, 'limit': 20}
+            if rng.random() < 0.5:
+                params['country'] = rng.choice(seed.COUNTRIES)
+            return 'api', get_event('matches', params)
+        if name == 'heartbeat':
+            return 'api', post_event('heartbeat', {'userId': user_id})
+        if name == 'presence':
+            ids = ','.join(str(rng.randint(1, self.users)) for _ in range(50))
+            return 'api', get_event('presence', {'ids': ids})
+        if name == 'user':
+            return 'api', get_event('user', {'id': user_id})
+        if name == 'send_message':
+            return 'api', post_event('messages', {
+                'chatId': chat_id,
+                'senderId': self.chat_user1(chat_id),
+                'message': rng.choice(PHRASES),
+            })
+        if name == 'sync':
+            return 'api', get_event('sync', {'userId': user_id, 'cursor': SYNC_FROM_START})
+        if name == 'fold_counters':
+            return 'api', dict(post_event('fold_counters', {}), headers={'X-Timer-Token': os.environ['TIMER_TOKEN']})
+        if name in ('gifts', 'achievements'):
+            return 'api', get_event(name, {})
+        if name == 'lessons':
+            return 'api', get_event('lessons', {'language': 'English', 'userId': user_id})
+        if name == 'translate':
+            return 'translate', {
+                'httpMethod': 'POST',
+                'body': json.dumps({'text': rng.choice(PHRASES), 'targetLang': rng.choice(['es', 'de', 'ru'])}),
+            }
+        if name == 'translate_batch':
+            return 'translate', {
+                'httpMethod': 'POST',
+                'body': json.dumps({'texts': [rng.choice(PHRASES) for _ in range(20)], 'targetLang': 'es'}),
+            }
+        raise ValueError(f'Unknown mix action: {name}')
+
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[str, List[Tuple[float, int, int, float]]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, elapsed_ms: float, status: int, queries: int, db_ms: float) -> None:
+        with self._lock:
+            self.samples.setdefault(name, []).append((elapsed_ms, status, queries, db_ms))
+
+def instrument_queries(api) -> threading.local:
+    """Captures query count and DB time of each api request from its request metrics."""
+    captured = threading.local()
+    original = api.finish_request_metrics
+
+    def capture(metrics, response, error):
+        captured.queries = len(metrics['queries'])
+        captured.db_ms = metrics['db_ms']
+        original(metrics, response, error)
+
+    api.finish_request_metrics = capture
+    return captured
+
+def run_load(handlers: Dict[str, Any], captured: threading.local, workload: Workload,
+             mix: List[Tuple[str, float]], concurrency: int, duration: float,
+             random_seed: int, recorder: Optional[Recorder]) -> float:
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    deadline = time.monotonic() + duration
+
+    def worker(index: int) -> None:
+        rng = random.Random(random_seed * 1000 + index)
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            target, event = workload.build(name, rng)
+            captured.queries, captured.db_ms = 0, 0.0
+            started = time.perf_counter()
+            response = handlers[target].handler(event, None)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if recorder is not None:
+                recorder.add(name, elapsed_ms, response['statusCode'], captured.queries, captured.db_ms)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker, i) for i in range(concurrency)]:
+            future.result()
+    return time.perf_counter() - started
+
+def summarize(recorder: Recorder, elapsed: float) -> Dict[str, Any]:
+    actions = {}
+    total = 0
+    for name, samples in sorted(recorder.samples.items()):
+        latencies = sorted(s[0] for s in samples)
+        total += len(samples)
+        actions[name] = {
+            'requests': len(samples),
+            'errors': sum(1 for s in samples if s[1] >= 500),
+            'rps': round(len(samples) / elapsed, 2),
+            'mean_ms': round(sum(latencies) / len(latencies), 3),
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'max_ms': round(latencies[-1], 3),
+            'queries_per_request': round(sum(s[2] for s in samples) / len(samples), 3),
+            'db_ms_per_request': round(sum(s[3] for s in samples) / len(samples), 3),
+        }
+    return {'requests': total, 'rps': round(total / elapsed, 2) if elapsed else 0.0, 'actions': actions}
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, text=True).strip()
+    except Exception:
+        return None
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    lines = [f"{'action':<16}{'p50 ms':>18}{'p95 ms':>18}{'p99 ms':>18}{'queries/req':>16}"]
+    for name, current in report['summary']['actions'].items():
+        previous = baseline.get('summary', {}).get('actions', {}).get(name)
+        if previous is None:
+            continue
+        cells = []
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            delta = (current[key] - previous[key]) / previous[key] * 100 if previous[key] else 0.0
+            cells.append(f"{current[key]:>9.2f} ({delta:+5.1f}%)")
+        lines.append(f"{name:<16}" + ''.join(f'{c:>18}' for c in cells)
+                     + f"{previous['queries_per_request']:>7.1f} -> {current['queries_per_request']:<6.1f}")
+    return lines
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL'), required=not os.environ.get('BENCH_DATABASE_URL'))
+    parser.add_argument('--seed', action='store_true', help='recreate the schema and dataset before running')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--chats', type=int, default=50000)
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--mix', default=DEFAULT_MIX)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--warmup', type=float, default=3.0)
+    parser.add_argument('--stub-latency-ms', type=float, default=80.0)
+    parser.add_argument('--random-seed', type=int, default=1)
+    parser.add_argument('--out', help='write the JSON report to this file instead of stdout')
+    parser.add_argument('--baseline', help='previous JSON report to compare against')
+    args = parser.parse_args(argv)
+
+    if args.seed:
+        conn = psycopg2.connect(args.dsn)
+        seed.apply_migrations(conn)
+        seed.seed_dataset(conn, args.users, args.chats, args.messages, 0.42)
+        conn.close()
+
+    stub = start_stub(latency_ms=args.stub_latency_ms)
+    os.environ.update({
+        'DATABASE_URL': psycopg2.extensions.make_dsn(args.dsn, options=f'-c search_path={seed.SCHEMA},public'),
+        'DB_POOL_SIZE': str(args.concurrency),
+        'METRICS_LOG': 'false',
+        'GOOGLE_TRANSLATE_API_KEY': 'bench',
+        'GOOGLE_TRANSLATE_URL': stub_url(stub),
+    })
+    os.environ.setdefault('TIMER_TOKEN', 'bench')
+
+    handlers = {
+        'api': load_handler('bench_api', os.path.join(ROOT_DIR, 'backend', 'api', 'index.py')),
+        'translate': load_handler('bench_translate', os.path.join(ROOT_DIR, 'backend', 'translate', 'index.py')),
+    }
+    captured = instrument_queries(handlers['api'])
+    workload = Workload(args.users, args.chats)
+    mix = parse_mix(args.mix)
+
+    if args.warmup > 0:
+        run_load(handlers, captured, workload, mix, args.concurrency, args.warmup, args.random_seed + 1, None)
+
+    TranslateStubHandler.requests_served = 0
+    TranslateStubHandler.segments_served = 0
+    recorder = Recorder()
+    elapsed = run_load(handlers, captured, workload, mix, args.concurrency, args.duration, args.random_seed, recorder)
+    stub.shutdown()
+
+    report = {
+        'config': {
+            'mix': dict(mix),
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'dataset': {'users': args.users, 'chats': args.chats, 'messages': args.messages},
+            'stub_latency_ms': args.stub_latency_ms,
+            'random_seed': args.random_seed,
+        },
+        'environment': {
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        },
+        'elapsed_s': round(elapsed, 3),
+        'summary': summarize(recorder, elapsed),
+        'translate_upstream': {
+            'requests': TranslateStubHandler.requests_served,
+            'segments': TranslateStubHandler.segments_served,
+        },
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            for line in compare(report, json.load(f)):
+                print(line, file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,140 @@
+"""
+Business: Build a local benchmark database from db_migrations plus a synthetic dataset
+Args: --dsn of a disposable local Postgres, dataset sizes (users, chats, messages)
+Returns: Schema t_p22749112_multilingual_communi recreated and filled; prints row counts
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from typing import Dict, List
+
+import psycopg2
+
+SCHEMA = 't_p22749112_multilingual_communi'
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'db_migrations')
+
+LANGUAGES = ['English', 'Russian', 'Spanish', 'French', 'German', 'Japanese', 'Chinese', 'Arabic', 'Italian', 'Portuguese']
+COUNTRIES = ['RU', 'US', 'ES', 'FR', 'DE', 'JP', 'CN', 'AE', 'IT', 'BR']
+
+def migration_files() -> List[str]:
+    files = [f for f in os.listdir(MIGRATIONS_DIR) if re.match(r'V\d+__.*\.sql$', f)]
+    return [os.path.join(MIGRATIONS_DIR, f) for f in sorted(files, key=lambda f: int(f[1:f.index('__')]))]
+
+def apply_migrations(conn) -> None:
+    with conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cur.execute(f"CREATE SCHEMA {SCHEMA}")
+        cur.execute(f"SET search_path TO {SCHEMA}, public")
+        for path in migration_files():
+            with open(path, encoding='utf-8') as f:
+                cur.execute(f.read())
+    conn.commit()
+
+def seed_dataset(conn, users: int, chats: int, messages: int, seed: float) -> Dict[str, int]:
+    """Generates rows server-side with generate_series so millions of messages load in seconds."""
+    if chats > users * (users - 1):
+        raise ValueError('Too many chats for the number of users')
+
+    with conn.cursor() as cur:
+        cur.execute(f"SET search_path TO {SCHEMA}, public")
+        cur.execute("SELECT setseed(%s)", (seed,))
+        cur.execute("""
+            TRUNCATE users, friendships, chats, chat_members, messages, user_achievements,
+                     gift_transactions, user_lessons, presence
+            RESTART IDENTITY CASCADE
+        """)
+
+        cur.execute("""
+            INSERT INTO users (email, name, avatar, native_language, learning_language, country,
+                               region, city, level, xp, coins, is_online, last_seen, last_active)
+            SELECT 'user' || g || '@bench.local',
+                   'User ' || g,
+                   '🚀',
+                   (%(languages)s::text[])[1 + g %% %(language_count)s],
+                   (%(languages)s::text[])[1 + (g / %(language_count)s + g + 1) %% %(language_count)s],
+                   (%(countries)s::text[])[1 + g %% %(country_count)s],
+                   'Region ' || (g %% 50),
+                   'City ' || (g %% 200),
+                   1 + (random() * 30)::int,
+                   (random() * 3000)::int,
+                   100 + (random() * 1000)::int,
+                   random() < 0.2,
+                   CURRENT_TIMESTAMP - random() * INTERVAL '30 days',
+                   CURRENT_TIMESTAMP - random() * INTERVAL '3 days'
+            FROM generate_series(1, %(users)s) g
+        """, {
+            'languages': LANGUAGES, 'language_count': len(LANGUAGES),
+            'countries': COUNTRIES, 'country_count': len(COUNTRIES),
+            'users': users,
+        })
+
+        cur.execute("""
+            INSERT INTO presence (user_id, last_heartbeat)
+            SELECT id, CURRENT_TIMESTAMP - random() * INTERVAL '60 seconds' FROM users WHERE is_online
+        """)
+
+        cur.execute("""
+            INSERT INTO user_achievements (user_id, achievement_id, progress)
+            SELECT u.id, a.id, 0 FROM users u CROSS JOIN achievements a
+        """)
+
+        # Chat c pairs user i with user i + k + 1 (mod n) where i = c mod n and k = c / n,
+        # which yields unique, non-self pairs while chats < n * (n - 1).
+        cur.execute("""
+            INSERT INTO chats (user1_id, user2_id, last_message, last_message_time)
+            SELECT 1 + (c %% %(users)s),
+                   1 + ((c %% %(users)s) + (c / %(users)s) + 1) %% %(users)s,
+                   'Hello!',
+                   CURRENT_TIMESTAMP - random() * INTERVAL '30 days'
+            FROM generate_series(0, %(chats)s - 1) c
+        """, {'users': users, 'chats': chats})
+
+        cur.execute("""
+            INSERT INTO chat_members (chat_id, user_id, partner_id, last_message, last_message_time)
+            SELECT id, user1_id, user2_id, last_message, last_message_time FROM chats
+            UNION ALL
+            SELECT id, user2_id, user1_id, last_message, last_message_time FROM chats
+        """)
+
+        cur.execute("""
+            INSERT INTO messages (chat_id, sender_id, message, created_at)
+            SELECT c.id,
+                   CASE WHEN g %% 2 = 0 THEN c.user1_id ELSE c.user2_id END,
+                   'Benchmark message ' || g,
+                   CURRENT_TIMESTAMP - (%(messages)s - g) * INTERVAL '1 second'
+            FROM generate_series(1, %(messages)s) g
+            JOIN chats c ON c.id = 1 + (g %% %(chats)s)
+        """, {'messages': messages, 'chats': chats})
+
+        cur.execute("ANALYZE")
+
+        counts = {}
+        for table in ('users', 'chats', 'chat_members', 'messages', 'user_achievements'):
+            cur.execute(f"SELECT COUNT(*) FROM {table}")
+            counts[table] = cur.fetchone()[0]
+    conn.commit()
+    return counts
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL'), required=not os.environ.get('BENCH_DATABASE_URL'))
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--chats', type=int, default=50000)
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--seed', type=float, default=0.42)
+    args = parser.parse_args(argv)
+
+    conn = psycopg2.connect(args.dsn)
+    started = time.perf_counter()
+    apply_migrations(conn)
+    counts = seed_dataset(conn, args.users, args.chats, args.messages, args.seed)
+    conn.close()
+
+    print(f"Seeded in {time.perf_counter() - started:.1f}s: " + ', '.join(f'{k}={v}' for k, v in counts.items()))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
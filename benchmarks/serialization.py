@@ -0,0 +1,81 @@
+"""
+Business: Micro-benchmark of api response encoding on a page of message rows
+Args: --rows per page (default 1000), --repeat timing rounds
+Returns: JSON report with ms per page for the old dict()+isoformat path and for to_json
+         with the stdlib encoder and with orjson (when installed)
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from psycopg2.extras import RealDictRow
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from run import load_handler
+
+def message_page(rows: int) -> List[RealDictRow]:
+    """Rows shaped like get_chat_messages output, as RealDictCursor returns them."""
+    started = datetime(2024, 5, 1, 12, 0, 0, 123456)
+    page = []
+    for i in range(rows):
+        row = RealDictRow()
+        row.update({
+            'id': 1000000 + i,
+            'sender_id': 1 + i % 2,
+            'message': f'Benchmark message {i} — привет',
+            'translated_message': None if i % 3 else f'[es] Benchmark message {i}',
+            'is_voice': False,
+            'created_at': started + timedelta(seconds=i),
+            'sender_name': 'User 1' if i % 2 else 'User 2',
+            'sender_avatar': '🚀',
+        })
+        page.append(row)
+    return page
+
+def legacy_encode(page: List[RealDictRow]) -> str:
+    result = []
+    for msg in page:
+        msg_dict = dict(msg)
+        msg_dict['created_at'] = msg_dict['created_at'].isoformat()
+        result.append(msg_dict)
+    return json.dumps({'messages': result, 'hasMore': True})
+
+def time_encoder(encode: Callable[[], str], repeat: int) -> Dict[str, Any]:
+    number = 20
+    rounds = timeit.repeat(encode, number=number, repeat=repeat)
+    per_page = sorted(r / number * 1000 for r in rounds)
+    return {'best_ms': round(per_page[0], 3), 'median_ms': round(per_page[len(per_page) // 2], 3),
+            'bytes': len(encode().encode('utf-8'))}
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=7)
+    args = parser.parse_args(argv)
+
+    api = load_handler('bench_api', os.path.join(ROOT_DIR, 'backend', 'api', 'index.py'))
+    page = message_page(args.rows)
+    orjson = api.orjson
+
+    report = {'rows': args.rows, 'results': {}}
+    report['results']['legacy_dict_copies'] = time_encoder(lambda: legacy_encode(page), args.repeat)
+
+    api.orjson = None
+    report['results']['to_json_stdlib'] = time_encoder(lambda: api.to_json({'messages': page, 'hasMore': True}), args.repeat)
+    api.orjson = orjson
+    if orjson is not None:
+        report['results']['to_json_orjson'] = time_encoder(lambda: api.to_json({'messages': page, 'hasMore': True}), args.repeat)
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,142 @@
+"""
+Business: Sync consistency check against a local Postgres (seeded by benchmarks/seed.py or with --seed)
+Args: --dsn, --seed to recreate a small dataset first
+Returns: JSON report of each scenario; exits 1 when a message is lost, duplicated or delayed
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Set
+
+import psycopg2
+import psycopg2.extensions
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import seed
+from run import get_event, load_handler, post_event
+
+class SyncClient:
+    """Follows one user's sync cursor the way the web client does."""
+
+    def __init__(self, api, user_id: int):
+        self.api = api
+        self.user_id = user_id
+        self.cursor = self.poll()['cursor']
+        self.seen: List[int] = []
+
+    def poll(self, wait: float = 0) -> Dict[str, Any]:
+        params: Dict[str, Any] = {'userId': self.user_id, 'wait': wait}
+        if getattr(self, 'cursor', None):
+            params['cursor'] = self.cursor
+        response = self.api.handler(get_event('sync', params), None)
+        if response['statusCode'] != 200:
+            raise RuntimeError(f"sync -> {response['statusCode']}: {response['body']}")
+        return json.loads(response['body'])
+
+    def drain(self, wait: float = 0) -> List[int]:
+        """Polls until hasMore is false; returns the message ids received."""
+        received = []
+        while True:
+            result = self.poll(wait)
+            self.cursor = result['cursor']
+            received += [m['id'] for m in result['messages']]
+            if not result['hasMore']:
+                break
+        self.seen += received
+        return received
+
+def insert_message(conn, chat_id: int, sender_id: int, text: str) -> int:
+    with conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO messages (chat_id, sender_id, message) VALUES (%s, %s, %s) RETURNING id",
+            (chat_id, sender_id, text)
+        )
+        return cur.fetchone()[0]
+
+def open_unrelated_transaction(dsn: str):
+    """A worker-style claim: FOR UPDATE SKIP LOCKED holds an xid until the transaction ends."""
+    conn = psycopg2.connect(dsn)
+    with conn.cursor() as cur:
+        cur.execute("SELECT id FROM translation_jobs ORDER BY id LIMIT 1 FOR UPDATE SKIP LOCKED")
+        cur.execute("SELECT pg_current_xact_id()")
+    return conn
+
+def check(report: Dict[str, Any], name: str, ok: bool, **details: Any) -> None:
+    report['scenarios'][name] = dict(details, ok=ok)
+    report['ok'] = report['ok'] and ok
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL'), required=not os.environ.get('BENCH_DATABASE_URL'))
+    parser.add_argument('--seed', action='store_true', help='recreate the schema with a small dataset before running')
+    args = parser.parse_args(argv)
+
+    if args.seed:
+        conn = psycopg2.connect(args.dsn)
+        seed.apply_migrations(conn)
+        seed.seed_dataset(conn, 100, 100, 1000, 0.42)
+        conn.close()
+
+    dsn = psycopg2.extensions.make_dsn(args.dsn, options=f'-c search_path={seed.SCHEMA},public')
+    os.environ.update({'DATABASE_URL': dsn, 'METRICS_LOG': 'false'})
+    api = load_handler('bench_api', os.path.join(ROOT_DIR, 'backend', 'api', 'index.py'))
+
+    writer = psycopg2.connect(dsn)
+    with writer.cursor() as cur:
+        cur.execute("SELECT chat_id, user_id, partner_id FROM chat_members ORDER BY chat_id LIMIT 1")
+        chat_id, user_id, partner_id = cur.fetchone()
+        cur.execute(
+            "INSERT INTO translation_jobs (message_id, target_lang) SELECT MIN(id), 'English' FROM messages ON CONFLICT DO NOTHING"
+        )
+    writer.commit()
+
+    report: Dict[str, Any] = {'chatId': chat_id, 'userId': user_id, 'ok': True, 'scenarios': {}}
+    client = SyncClient(api, user_id)
+    sent: Set[int] = set()
+
+    # An unrelated open transaction must not hold back messages committed after it started.
+    unrelated = open_unrelated_transaction(dsn)
+    response = api.handler(post_event('messages', {'chatId': chat_id, 'senderId': partner_id, 'message': 'while open'}), None)
+    sent.add(json.loads(response['body'])['id'])
+    started = time.perf_counter()
+    received = client.drain(wait=3)
+    elapsed = time.perf_counter() - started
+    unrelated.rollback()
+    unrelated.close()
+    check(report, 'unrelated_open_transaction', received == sorted(sent) and elapsed < 1,
+          received=received, seconds=round(elapsed, 3))
+
+    # A message whose id was taken first but which commits last must still arrive.
+    early = psycopg2.connect(dsn)
+    first = insert_message(early, chat_id, partner_id, 'commits last')
+    second = insert_message(writer, chat_id, partner_id, 'commits first')
+    writer.commit()
+    before = client.drain()
+    early.commit()
+    early.close()
+    after = client.drain()
+    sent.update([first, second])
+    check(report, 'out_of_order_commit', before == [second] and after == [first], before=before, after=after)
+
+    # Pages split inside one transaction without skipping or repeating.
+    bulk = [insert_message(writer, chat_id, partner_id, f'bulk {i}') for i in range(api.SYNC_MESSAGES_MAX + 50)]
+    writer.commit()
+    sent.update(bulk)
+    paged = client.drain()
+    check(report, 'paged_transaction', paged == bulk, received=len(paged), expected=len(bulk))
+
+    check(report, 'no_duplicates', len(client.seen) == len(set(client.seen)) and set(client.seen) == sent,
+          received=len(client.seen), sent=len(sent))
+    writer.close()
+
+    print(json.dumps(report, indent=2))
+    return 0 if report['ok'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
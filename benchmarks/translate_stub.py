@@ -0,0 +1,73 @@
+"""
+Business: Local stand-in for the Google Translation v2 endpoint used by benchmarks
+Args: --port to listen on, --latency-ms added to every response
+Returns: JSON {"data": {"translations": [...]}} with one entry per q parameter
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+class TranslateStubHandler(BaseHTTPRequestHandler):
+    latency_ms = 0.0
+    requests_served = 0
+    segments_served = 0
+    _counter_lock = threading.Lock()
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get('Content-Length', 0))
+        form = urllib.parse.parse_qs(self.rfile.read(length).decode('utf-8'))
+        texts = form.get('q', [])
+        target = form.get('target', ['en'])[0]
+
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+        with self._counter_lock:
+            TranslateStubHandler.requests_served += 1
+            TranslateStubHandler.segments_served += len(texts)
+
+        body = json.dumps({
+            'data': {'translations': [{'translatedText': f'[{target}] {text}'} for text in texts]}
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+def start_stub(port: int = 0, latency_ms: float = 0.0) -> ThreadingHTTPServer:
+    """Starts the stub in a daemon thread; the endpoint URL is stub_url(server)."""
+    TranslateStubHandler.latency_ms = latency_ms
+    server = ThreadingHTTPServer(('127.0.0.1', port), TranslateStubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def stub_url(server: ThreadingHTTPServer) -> str:
+    return f'http://127.0.0.1:{server.server_address[1]}/language/translate/v2'
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency-ms', type=float, default=80.0)
+    args = parser.parse_args(argv)
+
+    server = start_stub(args.port, args.latency_ms)
+    print(f'Translate stub listening on {stub_url(server)}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,10 @@
+CREATE TABLE IF NOT EXISTS t_p22749112_multilingual_communi.translation_cache (
+    text_hash CHAR(64) NOT NULL,
+    source_lang VARCHAR(16) NOT NULL,
+    target_lang VARCHAR(16) NOT NULL,
+    translated TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (text_hash, source_lang, target_lang)
+);
+
+CREATE INDEX IF NOT EXISTS idx_translation_cache_created ON t_p22749112_multilingual_communi.translation_cache(created_at);
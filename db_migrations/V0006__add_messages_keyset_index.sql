@@ -0,0 +1,3 @@
+CREATE INDEX IF NOT EXISTS idx_messages_chat_created ON t_p22749112_multilingual_communi.messages(chat_id, created_at DESC, id DESC);
+
+DROP INDEX IF EXISTS t_p22749112_multilingual_communi.idx_messages_chat;
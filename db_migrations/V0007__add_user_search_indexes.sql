@@ -0,0 +1,11 @@
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE t_p22749112_multilingual_communi.users ADD COLUMN IF NOT EXISTS search_text TEXT
+    GENERATED ALWAYS AS (lower(name || ' ' || native_language || ' ' || learning_language || ' ' || country)) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_users_search_trgm ON t_p22749112_multilingual_communi.users USING GIN (search_text gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_region_trgm ON t_p22749112_multilingual_communi.users USING GIN (lower(region) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_country_trgm ON t_p22749112_multilingual_communi.users USING GIN (lower(country) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_country_lower ON t_p22749112_multilingual_communi.users (lower(country));
+CREATE INDEX IF NOT EXISTS idx_users_name_prefix ON t_p22749112_multilingual_communi.users (lower(name) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_users_online_seen ON t_p22749112_multilingual_communi.users (is_online DESC, last_seen DESC, id DESC);
@@ -0,0 +1,23 @@
+INSERT INTO t_p22749112_multilingual_communi.user_achievements (user_id, achievement_id, progress, unlocked, unlocked_at)
+SELECT p.user_id, p.achievement_id,
+       LEAST(p.requirement_value, p.current_value),
+       p.current_value >= p.requirement_value,
+       CASE WHEN p.current_value >= p.requirement_value THEN CURRENT_TIMESTAMP END
+FROM (
+    SELECT u.id as user_id, a.id as achievement_id, a.requirement_value,
+           CASE a.requirement_type
+               WHEN 'messages' THEN u.total_messages
+               WHEN 'words' THEN u.words_learned
+               WHEN 'level' THEN u.level
+               WHEN 'streak' THEN u.streak_days
+               WHEN 'friends' THEN (SELECT COUNT(*) FROM t_p22749112_multilingual_communi.friendships f WHERE f.user_id = u.id)
+               WHEN 'gifts' THEN (SELECT COUNT(*) FROM t_p22749112_multilingual_communi.gift_transactions g WHERE g.sender_id = u.id)
+               ELSE 0
+           END as current_value
+    FROM t_p22749112_multilingual_communi.users u
+    CROSS JOIN t_p22749112_multilingual_communi.achievements a
+) p
+ON CONFLICT (user_id, achievement_id) DO UPDATE
+SET progress = GREATEST(user_achievements.progress, EXCLUDED.progress),
+    unlocked = user_achievements.unlocked OR EXCLUDED.unlocked,
+    unlocked_at = COALESCE(user_achievements.unlocked_at, EXCLUDED.unlocked_at);
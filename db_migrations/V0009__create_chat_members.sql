@@ -0,0 +1,21 @@
+CREATE TABLE IF NOT EXISTS t_p22749112_multilingual_communi.chat_members (
+    chat_id INTEGER NOT NULL REFERENCES t_p22749112_multilingual_communi.chats(id),
+    user_id INTEGER NOT NULL REFERENCES t_p22749112_multilingual_communi.users(id),
+    partner_id INTEGER NOT NULL REFERENCES t_p22749112_multilingual_communi.users(id),
+    last_message_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    unread_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (chat_id, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_chat_members_user_recent ON t_p22749112_multilingual_communi.chat_members
+    (user_id, last_message_time DESC, chat_id DESC) INCLUDE (partner_id, unread_count);
+
+INSERT INTO t_p22749112_multilingual_communi.chat_members (chat_id, user_id, partner_id, last_message_time, unread_count)
+SELECT id, user1_id, user2_id, COALESCE(last_message_time, created_at, CURRENT_TIMESTAMP), COALESCE(unread_count_user1, 0)
+FROM t_p22749112_multilingual_communi.chats
+WHERE user1_id IS NOT NULL AND user2_id IS NOT NULL
+UNION ALL
+SELECT id, user2_id, user1_id, COALESCE(last_message_time, created_at, CURRENT_TIMESTAMP), COALESCE(unread_count_user2, 0)
+FROM t_p22749112_multilingual_communi.chats
+WHERE user1_id IS NOT NULL AND user2_id IS NOT NULL
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,35 @@
+CREATE TABLE IF NOT EXISTS t_p22749112_multilingual_communi.catalog_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO t_p22749112_multilingual_communi.catalog_versions (name) VALUES
+('gifts'),
+('lessons'),
+('achievements')
+ON CONFLICT (name) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION t_p22749112_multilingual_communi.bump_catalog_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE t_p22749112_multilingual_communi.catalog_versions
+    SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE name = TG_ARGV[0];
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS gifts_catalog_version ON t_p22749112_multilingual_communi.gifts;
+CREATE TRIGGER gifts_catalog_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON t_p22749112_multilingual_communi.gifts
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p22749112_multilingual_communi.bump_catalog_version('gifts');
+
+DROP TRIGGER IF EXISTS lessons_catalog_version ON t_p22749112_multilingual_communi.lessons;
+CREATE TRIGGER lessons_catalog_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON t_p22749112_multilingual_communi.lessons
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p22749112_multilingual_communi.bump_catalog_version('lessons');
+
+DROP TRIGGER IF EXISTS achievements_catalog_version ON t_p22749112_multilingual_communi.achievements;
+CREATE TRIGGER achievements_catalog_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON t_p22749112_multilingual_communi.achievements
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p22749112_multilingual_communi.bump_catalog_version('achievements');
@@ -0,0 +1,9 @@
+CREATE TABLE IF NOT EXISTS t_p22749112_multilingual_communi.translation_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    message_id INTEGER NOT NULL REFERENCES t_p22749112_multilingual_communi.messages(id),
+    target_lang VARCHAR(100) NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_attempt_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(message_id, target_lang)
+);
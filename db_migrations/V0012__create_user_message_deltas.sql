@@ -0,0 +1,9 @@
+CREATE TABLE IF NOT EXISTS t_p22749112_multilingual_communi.user_message_deltas (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES t_p22749112_multilingual_communi.users(id),
+    delta INTEGER NOT NULL DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_message_deltas_user
+    ON t_p22749112_multilingual_communi.user_message_deltas(user_id);
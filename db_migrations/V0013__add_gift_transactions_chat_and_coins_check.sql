@@ -0,0 +1,6 @@
+ALTER TABLE t_p22749112_multilingual_communi.gift_transactions
+    ADD COLUMN IF NOT EXISTS chat_id INTEGER REFERENCES t_p22749112_multilingual_communi.chats(id);
+
+-- NOT VALID: enforced for every new write without scanning existing rows.
+ALTER TABLE t_p22749112_multilingual_communi.users
+    ADD CONSTRAINT users_coins_non_negative CHECK (coins >= 0) NOT VALID;
@@ -0,0 +1,15 @@
+-- Heartbeats are ephemeral: an unlogged table skips WAL and is simply empty after a crash.
+CREATE UNLOGGED TABLE IF NOT EXISTS t_p22749112_multilingual_communi.presence (
+    user_id INTEGER PRIMARY KEY,
+    last_heartbeat TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_presence_heartbeat
+    ON t_p22749112_multilingual_communi.presence (last_heartbeat DESC, user_id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_users_last_seen
+    ON t_p22749112_multilingual_communi.users (last_seen DESC NULLS LAST, id DESC);
+
+DROP INDEX IF EXISTS t_p22749112_multilingual_communi.idx_users_online_seen;
+
+UPDATE t_p22749112_multilingual_communi.users SET is_online = false WHERE is_online;
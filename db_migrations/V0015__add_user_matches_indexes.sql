@@ -0,0 +1,7 @@
+CREATE INDEX IF NOT EXISTS idx_users_matches
+    ON t_p22749112_multilingual_communi.users
+    (lower(native_language), lower(learning_language), last_seen DESC NULLS LAST, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_users_matches_country
+    ON t_p22749112_multilingual_communi.users
+    (lower(native_language), lower(learning_language), lower(country), last_seen DESC NULLS LAST, id DESC);
@@ -0,0 +1,24 @@
+-- One row per user per board with the rank precomputed, so "my rank" is an index lookup
+-- and top-N is an ordered index range. Refreshed on a schedule by action=refresh_leaderboards.
+CREATE MATERIALIZED VIEW IF NOT EXISTS t_p22749112_multilingual_communi.leaderboard AS
+SELECT 'global'::text AS scope, ''::text AS scope_value, id AS user_id, xp, level,
+       RANK() OVER (ORDER BY xp DESC) AS rank
+FROM t_p22749112_multilingual_communi.users
+UNION ALL
+SELECT 'country', lower(COALESCE(country, '')), id, xp, level,
+       RANK() OVER (PARTITION BY lower(COALESCE(country, '')) ORDER BY xp DESC)
+FROM t_p22749112_multilingual_communi.users
+UNION ALL
+SELECT 'language', lower(learning_language), id, xp, level,
+       RANK() OVER (PARTITION BY lower(learning_language) ORDER BY xp DESC)
+FROM t_p22749112_multilingual_communi.users;
+
+-- Required by REFRESH ... CONCURRENTLY, and the "my rank" lookup.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_leaderboard_user
+    ON t_p22749112_multilingual_communi.leaderboard (scope, scope_value, user_id);
+
+CREATE INDEX IF NOT EXISTS idx_leaderboard_rank
+    ON t_p22749112_multilingual_communi.leaderboard (scope, scope_value, rank, user_id);
+
+INSERT INTO t_p22749112_multilingual_communi.catalog_versions (name) VALUES ('leaderboard')
+ON CONFLICT (name) DO NOTHING;
@@ -0,0 +1,7 @@
+-- Shared request counters for RATE_LIMIT_SHARED: one row per (client, action) holding the hits
+-- of the current fixed window. Losing them on a crash only resets the windows, so skip WAL.
+CREATE UNLOGGED TABLE IF NOT EXISTS t_p22749112_multilingual_communi.rate_limits (
+    key VARCHAR(200) PRIMARY KEY,
+    window_id BIGINT NOT NULL,
+    hits INTEGER NOT NULL
+);
@@ -0,0 +1,12 @@
+-- Sync cursors follow the writing transaction instead of the id/clock order: a row is only
+-- handed out once every transaction that started before it has finished, so a message that
+-- commits after a higher id is never skipped. Existing rows keep NULL and predate every cursor;
+-- setting the default separately avoids rewriting the tables.
+ALTER TABLE t_p22749112_multilingual_communi.messages ADD COLUMN IF NOT EXISTS xact_id xid8;
+ALTER TABLE t_p22749112_multilingual_communi.messages ALTER COLUMN xact_id SET DEFAULT pg_current_xact_id();
+
+ALTER TABLE t_p22749112_multilingual_communi.chat_members ADD COLUMN IF NOT EXISTS xact_id xid8;
+ALTER TABLE t_p22749112_multilingual_communi.chat_members ALTER COLUMN xact_id SET DEFAULT pg_current_xact_id();
+
+CREATE INDEX IF NOT EXISTS idx_messages_chat_xact
+    ON t_p22749112_multilingual_communi.messages(chat_id, xact_id, id) WHERE xact_id IS NOT NULL;
@@ -0,0 +1,7 @@
+-- Ranked user search orders by word-similarity distance (<<->), which only a GiST trigram
+-- index can return in order; GIN had to rank and sort every LIKE match, and language or
+-- country terms match a large share of users. GiST also serves the LIKE filter, so it
+-- replaces the GIN index.
+CREATE INDEX IF NOT EXISTS idx_users_search_gist ON t_p22749112_multilingual_communi.users USING GIST (search_text gist_trgm_ops);
+
+DROP INDEX IF EXISTS t_p22749112_multilingual_communi.idx_users_search_trgm;
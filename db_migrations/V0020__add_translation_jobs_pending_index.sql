@@ -0,0 +1,8 @@
+-- The worker now deletes jobs that used up TRANSLATION_JOB_MAX_ATTEMPTS; clear the ones left
+-- behind before that, and let the claim walk only jobs still eligible. The 5 below is that
+-- constant in backend/api/index.py, which is fixed rather than read from the environment so
+-- the claim's attempts < 5 always matches this index predicate; change both together.
+DELETE FROM t_p22749112_multilingual_communi.translation_jobs WHERE attempts >= 5;
+
+CREATE INDEX IF NOT EXISTS idx_translation_jobs_pending
+    ON t_p22749112_multilingual_communi.translation_jobs(id) WHERE attempts < 5;
@@ -0,0 +1,14 @@
+-- The chat list joined chats only for the last message preview. Keeping the preview on each
+-- member row, and in the list index, lets the list run as an index-only scan of chat_members.
+-- Previews are cut to 200 characters so they fit in an index tuple.
+ALTER TABLE t_p22749112_multilingual_communi.chat_members ADD COLUMN IF NOT EXISTS last_message VARCHAR(200);
+
+UPDATE t_p22749112_multilingual_communi.chat_members cm
+SET last_message = LEFT(c.last_message, 200)
+FROM t_p22749112_multilingual_communi.chats c
+WHERE c.id = cm.chat_id;
+
+CREATE INDEX IF NOT EXISTS idx_chat_members_user_list ON t_p22749112_multilingual_communi.chat_members
+    (user_id, last_message_time DESC, chat_id DESC) INCLUDE (partner_id, unread_count, last_message);
+
+DROP INDEX IF EXISTS t_p22749112_multilingual_communi.idx_chat_members_user_recent;
@@ -0,0 +1,3 @@
+-- The worker claims jobs in a short transaction and translates with none open, so a claim is
+-- a lease instead of a row lock: claimed jobs are skipped until claimed_until passes.
+ALTER TABLE t_p22749112_multilingual_communi.translation_jobs ADD COLUMN IF NOT EXISTS claimed_until TIMESTAMP;
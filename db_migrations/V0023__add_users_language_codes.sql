@@ -0,0 +1,38 @@
+-- Matches compared free-text language names, so English/Russian never met Русский/Английский.
+-- native_code and learning_code hold the canonical code of each name. The mapping mirrors
+-- LANGUAGE_CODES in backend/api/index.py; change both together. Unknown names keep their
+-- lowercased text, so they still match each other exactly.
+CREATE OR REPLACE FUNCTION t_p22749112_multilingual_communi.language_code(name TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT CASE
+        WHEN lower(btrim(name)) IN ('english', 'английский') THEN 'en'
+        WHEN lower(btrim(name)) IN ('russian', 'русский') THEN 'ru'
+        WHEN lower(btrim(name)) IN ('spanish', 'español', 'испанский') THEN 'es'
+        WHEN lower(btrim(name)) IN ('french', 'français', 'французский') THEN 'fr'
+        WHEN lower(btrim(name)) IN ('german', 'deutsch', 'немецкий') THEN 'de'
+        WHEN lower(btrim(name)) IN ('italian', 'italiano', 'итальянский') THEN 'it'
+        WHEN lower(btrim(name)) IN ('portuguese', 'português', 'португальский') THEN 'pt'
+        WHEN lower(btrim(name)) IN ('chinese', '中文', 'китайский') THEN 'zh'
+        WHEN lower(btrim(name)) IN ('japanese', '日本語', 'японский') THEN 'ja'
+        WHEN lower(btrim(name)) IN ('korean', '한국어', 'корейский') THEN 'ko'
+        WHEN lower(btrim(name)) IN ('arabic', 'العربية', 'арабский') THEN 'ar'
+        ELSE lower(btrim(name))
+    END
+$$;
+
+ALTER TABLE t_p22749112_multilingual_communi.users
+    ADD COLUMN IF NOT EXISTS native_code TEXT
+        GENERATED ALWAYS AS (t_p22749112_multilingual_communi.language_code(native_language)) STORED,
+    ADD COLUMN IF NOT EXISTS learning_code TEXT
+        GENERATED ALWAYS AS (t_p22749112_multilingual_communi.language_code(learning_language)) STORED;
+
+DROP INDEX IF EXISTS t_p22749112_multilingual_communi.idx_users_matches;
+DROP INDEX IF EXISTS t_p22749112_multilingual_communi.idx_users_matches_country;
+
+CREATE INDEX IF NOT EXISTS idx_users_matches
+    ON t_p22749112_multilingual_communi.users
+    (native_code, learning_code, last_seen DESC NULLS LAST, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_users_matches_country
+    ON t_p22749112_multilingual_communi.users
+    (native_code, learning_code, lower(country), last_seen DESC NULLS LAST, id DESC);
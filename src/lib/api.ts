@@ -51,6 +51,20 @@ export interface Message {
   is_translated?: boolean;
 }
 
+export interface MessagePage {
+  messages: Message[];
+  nextCursor: string | null;
+  latestCursor: string | null;
+  hasMore: boolean;
+}
+
+export interface SyncResult {
+  messages: Array<Message & { chat_id: number }>;
+  chats: Chat[];
+  cursor: string;
+  hasMore: boolean;
+}
+
 export interface Achievement {
   id: number;
   name: string;
@@ -67,6 +81,21 @@ export interface Gift {
   price: number;
 }
 
+export interface GiftResult {
+  success: boolean;
+  sent: number;
+  coins: number;
+  unlockedAchievements: Array<{ id: number; name: string; icon: string }>;
+}
+
+export interface Leaderboard {
+  scope: 'global' | 'country' | 'language';
+  value: string;
+  top: Array<{ rank: number; id: number; name: string; avatar: string; country: string; xp: number; level: number }>;
+  refreshedAt: string | null;
+  me?: { rank: number; xp: number; level: number } | null;
+}
+
 export interface Lesson {
   id: number;
   title: string;
@@ -76,6 +105,40 @@ export interface Lesson {
   completed: boolean;
 }
 
+export interface BatchRequest {
+  id: string;
+  action: string;
+  method?: 'GET' | 'POST' | 'PUT';
+  params?: Record<string, string | number | boolean>;
+  body?: any;
+}
+
+export interface BatchResult<T = any> {
+  status: number;
+  headers: Record<string, string>;
+  body: T;
+}
+
+export interface Dashboard {
+  chats: BatchResult<Chat[]>;
+  achievements: BatchResult<Achievement[]>;
+  lessons: BatchResult<Lesson[]>;
+  gifts: BatchResult<Gift[]>;
+}
+
+// Writes answer with X-Primary-Until when the API reads from replicas; sending it back keeps
+// this client's reads on the primary until then, so it sees its own writes.
+let primaryUntil: string | null = null;
+
+async function apiFetch(url: string, options: RequestInit = {}): Promise<Response> {
+  const headers = new Headers(options.headers);
+  if (primaryUntil && Number(primaryUntil) > Date.now()) headers.set('X-Primary-Until', primaryUntil);
+  const response = await fetch(url, { ...options, headers });
+  const until = response.headers.get('X-Primary-Until');
+  if (until) primaryUntil = until;
+  return response;
+}
+
 async function apiCall(action: string, method: string = 'GET', body?: any): Promise<any> {
   const url = `${API_URL}/?action=${action}`;
   
@@ -90,7 +153,7 @@ async function apiCall(action: string, method: string = 'GET', body?: any): Prom
     options.body = JSON.stringify(body);
   }
   
-  const response = await fetch(url, options);
+  const response = await apiFetch(url, options);
   
   if (!response.ok) {
     const error = await response.json();
@@ -122,18 +185,56 @@ export const api = {
     region?: string;
     country?: string;
     onlineOnly?: boolean;
+    cursor?: string;
   } = {}): Promise<User[]> {
-    const { search, limit = 20, region, country, onlineOnly } = options;
+    const page = await api.getUsersPage(options);
+    return page.users;
+  },
+
+  async getUsersPage(options: {
+    search?: string;
+    limit?: number;
+    region?: string;
+    country?: string;
+    onlineOnly?: boolean;
+    cursor?: string;
+  } = {}): Promise<{ users: User[]; nextCursor: string | null }> {
+    const { search, limit = 20, region, country, onlineOnly, cursor } = options;
     const params = new URLSearchParams({ limit: limit.toString() });
     if (search) params.append('search', search);
     if (region) params.append('region', region);
     if (country) params.append('country', country);
     if (onlineOnly) params.append('onlineOnly', 'true');
-    return fetch(`${API_URL}/?action=users&${params.toString()}`).then(r => r.json());
+    if (cursor) params.append('cursor', cursor);
+    const response = await apiFetch(`${API_URL}/?action=users&${params.toString()}`);
+    return { users: await response.json(), nextCursor: response.headers.get('X-Next-Cursor') };
+  },
+
+  async getMatches(userId: number, options: {
+    limit?: number;
+    country?: string;
+    region?: string;
+    cursor?: string;
+  } = {}): Promise<{ users: User[]; nextCursor: string | null }> {
+    const { limit = 20, country, region, cursor } = options;
+    const params = new URLSearchParams({ userId: userId.toString(), limit: limit.toString() });
+    if (country) params.append('country', country);
+    if (region) params.append('region', region);
+    if (cursor) params.append('cursor', cursor);
+    const response = await apiFetch(`${API_URL}/?action=matches&${params.toString()}`);
+    return { users: await response.json(), nextCursor: response.headers.get('X-Next-Cursor') };
+  },
+
+  async heartbeat(userId: number): Promise<{ ttl: number }> {
+    return apiCall('heartbeat', 'POST', { userId });
+  },
+
+  async getPresence(userIds: number[]): Promise<Array<{ id: number; is_online: boolean; last_seen: string | null }>> {
+    return apiFetch(`${API_URL}/?action=presence&ids=${userIds.join(',')}`).then(r => r.json());
   },
 
   async getUserProfile(userId: number): Promise<User> {
-    return fetch(`${API_URL}/?action=user&id=${userId}`).then(r => r.json());
+    return apiFetch(`${API_URL}/?action=user&id=${userId}`).then(r => r.json());
   },
 
   async updateUser(userId: number, data: Partial<User>): Promise<User> {
@@ -141,23 +242,69 @@ export const api = {
   },
 
   async getChats(userId: number): Promise<Chat[]> {
-    return fetch(`${API_URL}/?action=chats&userId=${userId}`).then(r => r.json());
+    return apiFetch(`${API_URL}/?action=chats&userId=${userId}`).then(r => r.json());
+  },
+
+  async getChatsPage(userId: number, limit: number = 50, cursor?: string): Promise<{ chats: Chat[]; nextCursor: string | null }> {
+    const params = new URLSearchParams({ userId: userId.toString(), limit: limit.toString() });
+    if (cursor) params.append('cursor', cursor);
+    const response = await apiFetch(`${API_URL}/?action=chats&${params.toString()}`);
+    return { chats: await response.json(), nextCursor: response.headers.get('X-Next-Cursor') };
   },
 
   async createChat(user1Id: number, user2Id: number): Promise<{ chatId: number }> {
     return apiCall('chats', 'POST', { user1Id, user2Id });
   },
 
+  async getMessagesPage(chatId: number, options: {
+    limit?: number;
+    before?: string;
+    after?: string;
+  } = {}): Promise<MessagePage> {
+    const { limit = 50, before, after } = options;
+    const params = new URLSearchParams({ chatId: chatId.toString(), limit: limit.toString() });
+    if (before) params.append('before', before);
+    if (after) params.append('after', after);
+    return apiFetch(`${API_URL}/?action=messages&${params.toString()}`).then(r => r.json());
+  },
+
   async getMessages(chatId: number, limit: number = 50): Promise<Message[]> {
-    return fetch(`${API_URL}/?action=messages&chatId=${chatId}&limit=${limit}`).then(r => r.json());
+    const page = await api.getMessagesPage(chatId, { limit });
+    return page.messages;
   },
 
   async sendMessage(chatId: number, senderId: number, message: string, translatedMessage?: string): Promise<Message> {
     return apiCall('messages', 'POST', { chatId, senderId, message, translatedMessage });
   },
 
+  async exportChat(chatId: number, format: 'ndjson' | 'csv' = 'ndjson'): Promise<Blob> {
+    const parts: string[] = [];
+    let afterId: string | null = null;
+    for (;;) {
+      const params = new URLSearchParams({ chatId: chatId.toString(), format });
+      if (afterId) params.append('afterId', afterId);
+      const response = await apiFetch(`${API_URL}/?action=export_chat&${params.toString()}`);
+      if (response.status === 429 || response.status === 503) {
+        const retryAfter = Number(response.headers.get('Retry-After') || '1');
+        await new Promise(resolve => setTimeout(resolve, retryAfter * 1000));
+        continue;
+      }
+      if (!response.ok) throw new Error('Export failed');
+      parts.push(await response.text());
+      afterId = response.headers.get('X-Next-Cursor');
+      if (!afterId) break;
+    }
+    return new Blob(parts, { type: format === 'csv' ? 'text/csv' : 'application/x-ndjson' });
+  },
+
+  async sync(userId: number, cursor?: string, wait: number = 0): Promise<SyncResult> {
+    const params = new URLSearchParams({ userId: userId.toString(), wait: wait.toString() });
+    if (cursor) params.append('cursor', cursor);
+    return apiFetch(`${API_URL}/?action=sync&${params.toString()}`).then(r => r.json());
+  },
+
   async getAchievements(userId: number): Promise<Achievement[]> {
-    return fetch(`${API_URL}/?action=achievements&userId=${userId}`).then(r => r.json());
+    return apiFetch(`${API_URL}/?action=achievements&userId=${userId}`).then(r => r.json());
   },
 
   async addFriend(userId: number, friendId: number): Promise<{ success: boolean }> {
@@ -165,19 +312,45 @@ export const api = {
   },
 
   async getLessons(language: string, userId: number): Promise<Lesson[]> {
-    return fetch(`${API_URL}/?action=lessons&language=${language}&userId=${userId}`).then(r => r.json());
+    return apiFetch(`${API_URL}/?action=lessons&language=${language}&userId=${userId}`).then(r => r.json());
   },
 
   async completeLesson(userId: number, lessonId: number, score: number = 100): Promise<{ xp: number; level: number; totalXp: number }> {
     return apiCall('complete_lesson', 'POST', { userId, lessonId, score });
   },
 
-  async sendGift(senderId: number, receiverId: number, giftId: number, chatId?: number): Promise<{ success: boolean }> {
+  async sendGift(senderId: number, receiverId: number, giftId: number, chatId?: number): Promise<GiftResult> {
     return apiCall('send_gift', 'POST', { senderId, receiverId, giftId, chatId });
   },
 
+  async sendGiftToMany(senderId: number, receiverIds: number[], giftId: number): Promise<GiftResult> {
+    return apiCall('send_gift', 'POST', { senderId, receiverIds, giftId });
+  },
+
+  async getLeaderboard(scope: Leaderboard['scope'] = 'global', options: { userId?: number; value?: string } = {}): Promise<Leaderboard> {
+    const params = new URLSearchParams({ scope });
+    if (options.userId) params.append('userId', options.userId.toString());
+    if (options.value) params.append('value', options.value);
+    return apiFetch(`${API_URL}/?action=leaderboard&${params.toString()}`).then(r => r.json());
+  },
+
   async getGifts(): Promise<Gift[]> {
-    return fetch(`${API_URL}/?action=gifts`).then(r => r.json());
+    return apiFetch(`${API_URL}/?action=gifts`).then(r => r.json());
+  },
+
+  async batch(requests: BatchRequest[]): Promise<Record<string, BatchResult>> {
+    const data = await apiCall('batch', 'POST', { requests });
+    return data.results;
+  },
+
+  async loadDashboard(userId: number, language: string): Promise<Dashboard> {
+    const results = await api.batch([
+      { id: 'chats', action: 'chats', params: { userId } },
+      { id: 'achievements', action: 'achievements', params: { userId } },
+      { id: 'lessons', action: 'lessons', params: { language, userId } },
+      { id: 'gifts', action: 'gifts' },
+    ]);
+    return results as unknown as Dashboard;
   },
 
   async translateText(text: string, targetLang: string, sourceLang: string = 'auto'): Promise<{
@@ -185,6 +358,9 @@ export const api = {
     translated: string;
     sourceLang: string;
     targetLang: string;
+    cached?: boolean;
+    cacheTier?: 'memory' | 'db' | null;
+    fallback?: boolean;
   }> {
     const response = await fetch(TRANSLATE_URL, {
       method: 'POST',
@@ -193,4 +369,27 @@ export const api = {
     });
     return response.json();
   },
+
+  async translateBatch(
+    texts: Array<string | { text: string; targetLang?: string; sourceLang?: string }>,
+    targetLang: string,
+    sourceLang: string = 'auto'
+  ): Promise<{
+    translations: Array<{
+      original: string;
+      translated: string;
+      sourceLang: string;
+      targetLang: string;
+      cached?: boolean;
+      cacheTier?: 'memory' | 'db' | null;
+      fallback?: boolean;
+    }>;
+  }> {
+    const response = await fetch(TRANSLATE_URL, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ texts, targetLang, sourceLang })
+    });
+    return response.json();
+  },
 };
\ No newline at end of file
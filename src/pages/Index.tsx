@@ -23,6 +23,9 @@ interface VipTier {
   badge: string;
 }
 
+// Well within the server's presence TTL (90 s), so one lost beat doesn't mark the user offline.
+const HEARTBEAT_INTERVAL_MS = 30000;
+
 const Index = () => {
   const { currentUser, isAuthenticated, logout } = useStore();
   const [activeTab, setActiveTab] = useState('home');
@@ -52,13 +55,18 @@ const Index = () => {
   useEffect(() => {
     if (currentUser) {
       loadUsers();
-      loadGifts();
-      loadAchievements();
-      loadLessons();
-      loadChats();
+      loadDashboard();
     }
   }, [currentUser]);
 
+  useEffect(() => {
+    if (!currentUser) return;
+    const beat = () => api.heartbeat(currentUser.id).catch(() => undefined);
+    beat();
+    const timer = setInterval(beat, HEARTBEAT_INTERVAL_MS);
+    return () => clearInterval(timer);
+  }, [currentUser?.id]);
+
   useEffect(() => {
     if (selectedChat) {
       loadMessages(selectedChat.id);
@@ -78,6 +86,26 @@ const Index = () => {
     }
   };
 
+  const loadDashboard = async () => {
+    if (!currentUser) return;
+    try {
+      const { chats, achievements, lessons, gifts } = await api.loadDashboard(
+        currentUser.id,
+        currentUser.learning_language
+      );
+      if (chats.status === 200) setChats(chats.body);
+      else toast.error('Ошибка загрузки чатов');
+      if (achievements.status === 200) setAchievements(achievements.body);
+      else toast.error('Ошибка загрузки достижений');
+      if (lessons.status === 200) setLessons(lessons.body);
+      else toast.error('Ошибка загрузки уроков');
+      if (gifts.status === 200) setGifts(gifts.body);
+      else toast.error('Ошибка загрузки подарков');
+    } catch (error: any) {
+      toast.error('Ошибка загрузки данных');
+    }
+  };
+
   const loadChats = async () => {
     if (!currentUser) return;
     try {
@@ -97,25 +125,6 @@ const Index = () => {
     }
   };
 
-  const loadAchievements = async () => {
-    if (!currentUser) return;
-    try {
-      const data = await api.getAchievements(currentUser.id);
-      setAchievements(data);
-    } catch (error: any) {
-      toast.error('Ошибка загрузки достижений');
-    }
-  };
-
-  const loadGifts = async () => {
-    try {
-      const data = await api.getGifts();
-      setGifts(data);
-    } catch (error: any) {
-      toast.error('Ошибка загрузки подарков');
-    }
-  };
-
   const loadLessons = async () => {
     if (!currentUser) return;
     try {
@@ -155,12 +164,11 @@ const Index = () => {
     if (!currentUser) return;
     
     try {
-      await api.sendGift(currentUser.id, receiverId, giftId, selectedChat?.id);
+      const result = await api.sendGift(currentUser.id, receiverId, giftId, selectedChat?.id);
       toast.success('Подарок отправлен!');
       setShowGiftModal(false);
       
-      const updatedUser = await api.getUserProfile(currentUser.id);
-      useStore.setState({ currentUser: updatedUser });
+      useStore.setState({ currentUser: { ...currentUser, coins: result.coins } });
     } catch (error: any) {
       toast.error(error.message || 'Ошибка отправки подарка');
     }
@@ -525,11 +533,11 @@ const Index = () => {
                     <div className={`max-w-[70%] rounded-2xl p-3 ${msg.sender_id === currentUser.id ? 'bg-primary text-white' : 'bg-muted'}`}>
                       <p className="text-sm font-semibold mb-1">{msg.sender_name}</p>
                       <p>{msg.message}</p>
-                      {translatedMessages[msg.id] && (
+                      {(translatedMessages[msg.id] || msg.translated_message) && (
                         <div className="mt-2 p-2 bg-black/10 rounded-lg">
                           <p className="text-xs opacity-70 flex items-center gap-1">
                             <Icon name="Languages" size={14} />
-                            {translatedMessages[msg.id]}
+                            {translatedMessages[msg.id] || msg.translated_message}
                           </p>
                         </div>
                       )}
@@ -537,7 +545,7 @@ const Index = () => {
                         <p className="text-xs opacity-70">
                           {new Date(msg.created_at).toLocaleTimeString('ru-RU', { hour: '2-digit', minute: '2-digit' })}
                         </p>
-                        {msg.sender_id !== currentUser.id && !translatedMessages[msg.id] && (
+                        {msg.sender_id !== currentUser.id && !translatedMessages[msg.id] && !msg.translated_message && (
                           <Button 
                             variant="ghost" 
                             size="sm" 